@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import threading
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+class CrawlFrontier:
+    """
+    Persistent crawl frontier: listing pages, document handles and PDF URLs with their status.
+
+    Every item is recorded as pending when discovered and as done or failed once processed,
+    together with what it produced (the PDF URLs of a document, the path, SHA-256 or text of
+    a PDF). Everything is committed as it happens, so a crawl that crashes or is stopped can
+    be resumed with only the pending and failed work left to do.
+    """
+
+    def __init__(self, db_path, resume=False):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS pages (page_id INTEGER PRIMARY KEY, status TEXT)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS documents (url TEXT PRIMARY KEY, status TEXT, mainpage TEXT, childrenpage TEXT)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS pdfs (url TEXT PRIMARY KEY, status TEXT, title TEXT, path TEXT, sha256 TEXT, text TEXT)'
+        )
+        if not resume:
+            for table in ['pages', 'documents', 'pdfs']:
+                self._db.execute(f'DELETE FROM {table}')
+        self._db.commit()
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            self._db.execute(query, params)
+            self._db.commit()
+
+    def _fetchone(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchone()
+
+    def _fetchall(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    # ---------------------------------- Pages ----------------------------------- #
+
+    def add_pages(self, page_ids):
+        with self._lock:
+            self._db.executemany('INSERT OR IGNORE INTO pages VALUES (?, ?)', [(p, PENDING) for p in page_ids])
+            self._db.commit()
+
+    def page_done(self, page_id):
+        row = self._fetchone('SELECT status FROM pages WHERE page_id = ?', (page_id,))
+        return row is not None and row[0] == DONE
+
+    def mark_page(self, page_id, status):
+        self._execute('INSERT OR REPLACE INTO pages VALUES (?, ?)', (page_id, status))
+
+    # -------------------------------- Documents --------------------------------- #
+
+    def add_documents(self, urls):
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR IGNORE INTO documents (url, status) VALUES (?, ?)', [(u, PENDING) for u in urls]
+            )
+            self._db.commit()
+
+    def get_document(self, url):
+        """Return the {'mainpage', 'childrenpage'} PDF URLs of a crawled document, None if not done yet."""
+        row = self._fetchone('SELECT mainpage, childrenpage FROM documents WHERE url = ? AND status = ?', (url, DONE))
+        return {'mainpage': json.loads(row[0]), 'childrenpage': json.loads(row[1])} if row else None
+
+    def record_document(self, url, pdf_dict):
+        """Record the result of crawl_document_page, failed if it reported an error."""
+        status = FAILED if 'error' in pdf_dict else DONE
+        self._execute(
+            'INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)',
+            (url, status, json.dumps(pdf_dict['mainpage']), json.dumps(pdf_dict['childrenpage']))
+        )
+
+    def id2pdfurls(self):
+        """Rebuild the {document url: (main PDF URLs, children PDF URLs)} map of every crawled document."""
+        rows = self._fetchall('SELECT url, mainpage, childrenpage FROM documents WHERE status = ?', (DONE,))
+        return {url: (json.loads(main), json.loads(children)) for url, main, children in rows}
+
+    # ----------------------------------- PDFs ----------------------------------- #
+
+    def add_pdfs(self, urls):
+        with self._lock:
+            self._db.executemany('INSERT OR IGNORE INTO pdfs (url, status) VALUES (?, ?)', [(u, PENDING) for u in urls])
+            self._db.commit()
+
+    def get_pdf(self, url):
+        """Return the title, path, SHA-256 and text of a processed PDF, None if not done yet."""
+        row = self._fetchone('SELECT title, path, sha256, text FROM pdfs WHERE url = ? AND status = ?', (url, DONE))
+        return dict(zip(['title', 'path', 'sha256', 'text'], row)) if row else None
+
+    def record_pdf(self, url, status, title=None, path=None, sha256=None, text=None):
+        self._execute('INSERT OR REPLACE INTO pdfs VALUES (?, ?, ?, ?, ?, ?)', (url, status, title, path, sha256, text))
+
+    def iter_pdf_texts(self):
+        """Yield the (title, text) of every PDF extracted in read mode, one row at a time and one per distinct text of a title."""
+        # A separate connection streams the rows without holding the writers' lock
+        db = sqlite3.connect(self.db_path)
+        try:
+            yield from db.execute(
+                'SELECT title, text FROM pdfs WHERE rowid IN '
+                '(SELECT MAX(rowid) FROM pdfs WHERE status = ? AND text IS NOT NULL GROUP BY title, text)', (DONE,)
+            )
+        finally:
+            db.close()
+
+    # ---------------------------------------------------------------------------- #
+
+    def counts(self):
+        return {
+            table: dict(self._fetchall(f'SELECT status, COUNT(*) FROM {table} GROUP BY status'))
+            for table in ['pages', 'documents', 'pdfs']
+        }
+
+    def print_summary(self):
+        for table, statuses in self.counts().items():
+            print(f"{table}: " + ', '.join(f"{n} {status}" for status, n in sorted(statuses.items())))
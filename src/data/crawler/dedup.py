@@ -0,0 +1,117 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+BLOOM_MAGIC = b'BLOOM1'
+
+def canonicalize_url(url):
+    """Canonical form of an IRIS handle or bitstream URL: lower-case scheme and host, no query, fragment or trailing slash."""
+    parts = urlsplit(url.strip())
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/')
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for `capacity` keys at the given false positive rate."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.nbits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.nhashes = max(1, round(self.nbits / capacity * math.log(2)))
+        self.bits = bytearray((self.nbits + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing (Kirsch-Mitzenmacher) from a single 128-bit digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(h1 + i * h2) % self.nbits for i in range(self.nhashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def save(self, f):
+        f.write(BLOOM_MAGIC + self.nbits.to_bytes(8, 'little') + self.nhashes.to_bytes(4, 'little'))
+        f.write(self.bits)
+
+    @classmethod
+    def load(cls, f):
+        bloom = cls.__new__(cls)
+        bloom.nbits = int.from_bytes(f.read(8), 'little')
+        bloom.nhashes = int.from_bytes(f.read(4), 'little')
+        bloom.bits = bytearray(f.read())
+        return bloom
+
+class DedupIndex:
+    """
+    Process-wide index of the handles and bitstreams already processed, keyed by canonical URL.
+
+    Workers `claim` a URL before fetching it and `release` it when done: a URL is only added to
+    the index on success, and while it is in flight other workers are turned away, so nothing is
+    fetched twice and failures can be retried later. A handle is only released as done once its
+    PDFs are, so that a PDF that failed is found again through its handle. The index is an
+    exact set, or a Bloom filter when `bloom_capacity` is given for very large runs, and is
+    persisted to `path` between runs.
+    """
+
+    def __init__(self, path=None, bloom_capacity=None, error_rate=0.001):
+        self.path = path
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._in_flight = set()
+
+        if path and os.path.exists(path):
+            self.seen = self._load(path)
+        elif bloom_capacity:
+            self.seen = BloomFilter(bloom_capacity, error_rate)
+        else:
+            self.seen = set()
+
+    @staticmethod
+    def _load(path):
+        with open(path, 'rb') as f:
+            if f.read(len(BLOOM_MAGIC)) == BLOOM_MAGIC:
+                return BloomFilter.load(f)
+            f.seek(0)
+            return set(line for line in f.read().decode('utf-8').splitlines() if line)
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        tmp_path = path + '.tmp'
+        with self._lock, open(tmp_path, 'wb') as f:
+            if isinstance(self.seen, BloomFilter):
+                self.seen.save(f)
+            else:
+                f.write(''.join(f"{key}\n" for key in sorted(self.seen)).encode('utf-8'))
+        os.replace(tmp_path, path)
+
+    def __contains__(self, url):
+        with self._lock:
+            return canonicalize_url(url) in self.seen
+
+    def claim(self, url):
+        """Return True if the caller should process `url`, False if it is done or in flight elsewhere."""
+        key = canonicalize_url(url)
+        with self._lock:
+            if key in self.seen or key in self._in_flight:
+                self.skipped += 1
+                return False
+            self._in_flight.add(key)
+            return True
+
+    def release(self, url, success=True):
+        key = canonicalize_url(url)
+        with self._lock:
+            self._in_flight.discard(key)
+            if success:
+                self.seen.add(key)
+
+    def print_summary(self):
+        kind = 'Bloom filter' if isinstance(self.seen, BloomFilter) else f"set of {len(self.seen)} URLs"
+        print(f"Deduplication index ({kind}): {self.skipped} duplicate handles and PDFs skipped")
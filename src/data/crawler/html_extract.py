@@ -0,0 +1,130 @@
+import html
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+except ImportError:
+    lxml = None
+
+ITEM_VIEW_ID = 'aspect_artifactbrowser_ItemViewer_div_item-view'
+
+# ------------------------------ BeautifulSoup ------------------------------- #
+
+def _bs4_listing_links(content):
+    return [a['href'] for a in BeautifulSoup(content, 'html.parser').select("a[href^='/handle/']")]
+
+def _bs4_item_view_links(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    return [a['href'] for a in soup.select(f"#{ITEM_VIEW_ID} a") if 'href' in a.attrs]
+
+def _bs4_last_page_href(content):
+    last_page_li = BeautifulSoup(content, 'html.parser').find('li', class_='last-page-link')
+    last_page_anchor = last_page_li.find('a') if last_page_li else None
+    return last_page_anchor.get('href') if last_page_anchor else None
+
+# ----------------------------------- lxml ----------------------------------- #
+
+def _lxml_tree(content):
+    try:
+        return lxml.html.fromstring(content)
+    except ParserError:  # Empty document
+        return None
+
+def _lxml_listing_links(content):
+    tree = _lxml_tree(content)
+    return [str(href) for href in tree.xpath("//a[starts-with(@href, '/handle/')]/@href")] if tree is not None else []
+
+def _lxml_item_view_links(content):
+    tree = _lxml_tree(content)
+    return [str(href) for href in tree.xpath(f"//*[@id='{ITEM_VIEW_ID}']//a/@href")] if tree is not None else []
+
+def _lxml_last_page_href(content):
+    tree = _lxml_tree(content)
+    if tree is None:
+        return None
+    last_page_li = tree.xpath("//li[contains(concat(' ', normalize-space(@class), ' '), ' last-page-link ')]")
+    hrefs = last_page_li[0].xpath('.//a[1]/@href') if last_page_li else []
+    return str(hrefs[0]) if hrefs else None
+
+# ---------------------------------- Scan ------------------------------------ #
+# Targeted regular expression scan of the raw page: no tree is built, only the tags
+# that matter are looked at.
+
+_A_TAG = re.compile(r'<a\s[^>]*>', re.IGNORECASE)
+_HREF = re.compile(r'''\shref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE)
+_ITEM_VIEW = re.compile(r'''<(\w+)\s[^>]*\bid\s*=\s*["']?''' + ITEM_VIEW_ID + r'''["'\s>]''', re.IGNORECASE)
+_LAST_PAGE_LI = re.compile(r'''<li\s[^>]*\bclass\s*=\s*["'][^"']*\blast-page-link\b[^>]*>''', re.IGNORECASE)
+
+def _decode(content):
+    return content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content
+
+def _href(tag):
+    match = _HREF.search(tag)
+    return html.unescape(next(group for group in match.groups() if group is not None)) if match else None
+
+def _scan_listing_links(content):
+    hrefs = (_href(tag) for tag in _A_TAG.findall(_decode(content)))
+    return [href for href in hrefs if href is not None and href.startswith('/handle/')]
+
+def _scan_item_view_links(content):
+    text = _decode(content)
+    links = []
+    for container in _ITEM_VIEW.finditer(text):
+        # Collect the links up to the tag closing the container, nested ones of the same name included
+        tag_pattern = re.compile(rf'<(/?)({container.group(1)}|a)\b[^>]*>', re.IGNORECASE)
+        depth = 1
+        for tag in tag_pattern.finditer(text, container.end()):
+            if tag.group(2).lower() == 'a':
+                if not tag.group(1):
+                    href = _href(tag.group(0))
+                    if href is not None:
+                        links.append(href)
+            elif tag.group(1):
+                depth -= 1
+                if depth == 0:
+                    break
+            elif not tag.group(0).endswith('/>'):
+                depth += 1
+    return links
+
+def _scan_last_page_href(content):
+    text = _decode(content)
+    last_page_li = _LAST_PAGE_LI.search(text)
+    if last_page_li is None:
+        return None
+    end = text.find('</li>', last_page_li.end())
+    anchor = _A_TAG.search(text, last_page_li.end(), end if end != -1 else len(text))
+    return _href(anchor.group(0)) if anchor else None
+
+# ---------------------------------------------------------------------------- #
+
+BACKENDS = {
+    'bs4': (_bs4_listing_links, _bs4_item_view_links, _bs4_last_page_href),
+    'scan': (_scan_listing_links, _scan_item_view_links, _scan_last_page_href),
+}
+if lxml is not None:
+    BACKENDS['lxml'] = (_lxml_listing_links, _lxml_item_view_links, _lxml_last_page_href)
+
+# A real parser when lxml is installed, the scan is as fast but trusts the page layout
+BACKEND = 'lxml' if lxml is not None else 'scan'
+
+def set_backend(name):
+    global BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML backend {name}, available: {', '.join(BACKENDS)}")
+    BACKEND = name
+
+def listing_links(content):
+    """Return the hrefs of a discover listing page that point to a handle, in page order."""
+    return BACKENDS[BACKEND][0](content)
+
+def item_view_links(content):
+    """Return the hrefs of every link inside the item view of a document page, in page order."""
+    return BACKENDS[BACKEND][1](content)
+
+def last_page_href(content):
+    """Return the href of the last page link of a listing's pagination, None if there is none."""
+    return BACKENDS[BACKEND][2](content)
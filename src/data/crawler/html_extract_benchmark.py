@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import time
+
+import html_extract
+
+BOILERPLATE = ''.join(
+    f'<div class="ds-static-div"><p class="hidden-xs">Navigation entry {i} &amp; related content</p>'
+    f'<ul class="ds-simple-list"><li><a href="/discover?filtertype=subject&amp;filter_relational_operator=equals&amp;filter=Topic+{i}">Topic {i}</a></li></ul></div>'
+    for i in range(60)
+)
+HEAD = ('<head><meta charset="utf-8"><title>IRIS</title>'
+        + ''.join(f'<link rel="stylesheet" href="/themes/Mirage2/styles/main{i}.css">' for i in range(10))
+        + '<script>var theme = {"path": "/themes/Mirage2/", "config": {"minify": true}};</script></head>')
+
+def item_page(handle, nbr_pdfs, nbr_children):
+    """A document page shaped like an IRIS item view: metadata, bitstreams and language versions."""
+    metadata = ''.join(
+        f'<div class="simple-item-view-other word-break"><h5>Field {i}</h5><span>Value {i} of the guideline metadata</span></div>'
+        for i in range(25)
+    )
+    bitstreams = ''.join(
+        f'<div class="file-wrapper"><a href="/bitstream/handle/10665/{handle}/{handle}-{i}_eng.pdf?sequence={i}&amp;isAllowed=y">'
+        f'<i aria-hidden="true" class="glyphicon glyphicon-file"></i> View/Open</a></div>'
+        for i in range(nbr_pdfs)
+    )
+    children = ''.join(
+        f'<li><a href="https://iris.who.int/handle/10665/{handle + 1000 + i}">Version {i}</a></li>' for i in range(nbr_children)
+    )
+    return (f'<!DOCTYPE html><html>{HEAD}<body><div id="ds-header-wrapper">{BOILERPLATE}</div>'
+            f'<div id="aspect_artifactbrowser_ItemViewer_div_item-view" class="ds-static-div primary">'
+            f'<div class="item-summary-view-metadata">{metadata}</div>{bitstreams}<ul>{children}</ul>'
+            f'<a href="/handle/10665/{handle}?show=full">Show full item record</a></div>'
+            f'<div id="ds-footer-wrapper">{BOILERPLATE}</div></body></html>').encode()
+
+def listing_page(page, last_page):
+    results = ''.join(
+        f'<div class="ds-artifact-item"><div class="artifact-description">'
+        f'<a href="/handle/10665/{page * 10 + i}"><h4 class="title">Guideline {i}</h4></a>'
+        f'<div class="artifact-info"><span class="author">WHO</span><span class="date">2024</span></div></div></div>'
+        for i in range(10)
+    )
+    pagination = (f'<ul class="pagination"><li class="page-link"><a href="/discover?page={page + 1}">{page + 1}</a></li>'
+                  f'<li class="last-page-link"><a href="/discover?rpp=10&amp;page={last_page}">{last_page}</a></li></ul>')
+    return (f'<!DOCTYPE html><html>{HEAD}<body><div id="ds-header-wrapper">{BOILERPLATE}</div>'
+            f'<div id="aspect_discovery_SimpleSearch_div_search-results">{results}</div>{pagination}'
+            f'<div id="ds-footer-wrapper">{BOILERPLATE}</div></body></html>').encode()
+
+def build_fixture_pages(nbr_pages):
+    random.seed(0)
+    items = [item_page(10000 + i, random.randint(1, 4), random.randint(0, 3)) for i in range(nbr_pages)]
+    listings = [listing_page(p, 2000) for p in range(1, nbr_pages + 1)]
+    return items, listings
+
+def load_pages(pages_dir):
+    """Saved IRIS pages: files starting with 'discover' are listings, the others item pages."""
+    items, listings = [], []
+    for name in sorted(os.listdir(pages_dir)):
+        with open(os.path.join(pages_dir, name), 'rb') as f:
+            (listings if name.startswith('discover') else items).append(f.read())
+    return items, listings
+
+def run(extract, pages, repeat):
+    start_time = time.process_time()
+    for _ in range(repeat):
+        results = [extract(page) for page in pages]
+    return len(pages) * repeat / (time.process_time() - start_time), results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the HTML link extractors on IRIS item and listing pages, in pages/second of CPU time.")
+    parser.add_argument('--pages-dir', type=str, default=None, help="Folder of saved IRIS pages to use instead of generated fixture pages.")
+    parser.add_argument('--pages', type=int, default=200, help="Number of generated fixture pages of each kind.")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    items, listings = load_pages(args.pages_dir) if args.pages_dir else build_fixture_pages(args.pages)
+    print(f"{len(items)} item pages, {len(listings)} listing pages, mean item page size {sum(map(len, items)) // max(1, len(items))} bytes")
+
+    reference = {}
+    for backend in html_extract.BACKENDS:
+        html_extract.set_backend(backend)
+        rates = []
+        for kind, extract, pages in [('items', html_extract.item_view_links, items),
+                                     ('listings', html_extract.listing_links, listings),
+                                     ('last page', html_extract.last_page_href, listings)]:
+            if not pages:
+                continue
+            rate, results = run(extract, pages, args.repeat)
+            rates.append(f"{kind} {rate:8.1f}")
+            assert reference.setdefault(kind, results) == results, f"{backend} disagrees with {list(html_extract.BACKENDS)[0]} on {kind}"
+        print(f"{backend:>5}: " + ', '.join(rates) + " pages/second per core")
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+class CacheMiss(requests.exceptions.RequestException):
+    """Raised in offline mode for a URL that was never cached."""
+
+class HTTPCache:
+    """
+    On-disk response cache keyed by URL, revalidated with ETag / Last-Modified.
+
+    Bodies live in `cache_dir` under the SHA-256 of their URL and an SQLite index keeps
+    their validators and last access time, which drives LRU eviction once the bodies
+    exceed `max_bytes`. Files stored elsewhere (downloaded PDFs) can be registered with
+    `store_external`: only their validators are cached and they never count towards
+    the size cap nor get evicted. With `offline=True` no request reaches the network
+    and cached bodies are replayed as they are.
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 << 30, offline=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0  # Answered from the cache, revalidated (304) or replayed offline
+        self.misses = 0  # Fetched in full
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'url TEXT PRIMARY KEY, path TEXT, external INTEGER, size INTEGER, '
+            'etag TEXT, last_modified TEXT, content_type TEXT, sha256 TEXT, last_access REAL)'
+        )
+        self._db.commit()
+
+    def _body_path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    # ---------------------------------- Lookup ---------------------------------- #
+
+    def lookup(self, url):
+        """Return the cache entry of a URL as a dict, None if absent or if its body disappeared."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT path, external, size, etag, last_modified, content_type, sha256 FROM entries WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                self._db.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self._db.commit()
+                return None
+            self._db.execute('UPDATE entries SET last_access = ? WHERE url = ?', (time.time(), url))
+            self._db.commit()
+
+        keys = ['path', 'external', 'size', 'etag', 'last_modified', 'content_type', 'sha256']
+        return {'url': url, **dict(zip(keys, row))}
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Build the revalidation headers for a cache entry."""
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    @staticmethod
+    def read_body(entry):
+        with open(entry['path'], 'rb') as f:
+            return f.read()
+
+    def to_response(self, entry):
+        """Rebuild a 200 requests.Response from a cache entry."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict({'Content-Type': entry['content_type'] or ''})
+        response._content = self.read_body(entry)
+        response.from_cache = True
+        return response
+
+    # ---------------------------------- Storage --------------------------------- #
+
+    def store(self, url, headers, body):
+        """Cache a response body with its validators, then evict down to `max_bytes`."""
+        path = self._body_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        self._upsert(url, path, False, len(body), headers, None)
+        self.evict()
+
+    def store_external(self, url, headers, path, sha256=None):
+        """Cache the validators of a response whose body was saved at `path` by the caller."""
+        self._upsert(url, path, True, 0, headers, sha256)
+
+    def _upsert(self, url, path, external, size, headers, sha256):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, path, int(external), size, headers.get('ETag'), headers.get('Last-Modified'),
+                 headers.get('Content-Type'), sha256, time.time())
+            )
+            self._db.commit()
+
+    def evict(self):
+        """Drop the least recently used cached bodies until they fit in `max_bytes`."""
+        with self._lock:
+            total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries WHERE external = 0').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for url, path, size in self._db.execute(
+                'SELECT url, path, size FROM entries WHERE external = 0 ORDER BY last_access'
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                if os.path.exists(path):
+                    os.remove(path)
+                self._db.execute('DELETE FROM entries WHERE url = ?', (url,))
+                total -= size
+            self._db.commit()
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def print_summary(self):
+        print(f"HTTP cache: {self.hits} hits, {self.misses} misses")
@@ -3,20 +3,90 @@ from types import SimpleNamespace
 
 from tqdm import tqdm
 
-import requests
 import os
+import re
+import json
 
 import pandas as pd
 
 import argparse
-
-from datasets import Dataset
+import sys
 
 import time
 
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 from dotenv import load_dotenv
 load_dotenv()
 
+import transport
+from icd_entity_cache import EntityCache
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_writer import ParquetShardWriter
+
+TOKEN_ENDPOINT = 'https://icdaccessmanagement.who.int/connect/token'
+
+def request_token(client_id=None, client_secret=None):
+    """Request a client credentials token, return the JSON answer with 'access_token' and 'expires_in'."""
+    client_id = client_id if client_id else os.getenv('ICD_CLIENT_ID')
+    client_secret = client_secret if client_secret else os.getenv('ICD_CLIENT_SECRET')
+    scope = 'icdapi_access'
+    grant_type = 'client_credentials'
+
+    # set data to post
+    payload = {'client_id': client_id, 
+            'client_secret': client_secret, 
+            'scope': scope, 
+            'grant_type': grant_type}
+            
+    # make request
+    response = transport.post(TOKEN_ENDPOINT, data=payload, verify=True)
+    response.raise_for_status()
+    return response.json()
+
+class TokenManager:
+    """
+    Thread-safe ICD API token shared by every request and worker.
+
+    The token is renewed `refresh_margin` seconds before its `expires_in` runs out, or as soon
+    as the API answers 401 to it; workers asking while it is renewed wait for the new one, so
+    a single token request is made for all of them.
+    """
+
+    def __init__(self, client_id=None, client_secret=None, refresh_margin=60):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin = refresh_margin
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+
+    def get(self):
+        with self._lock:
+            if self._token is None or time.time() >= self._expires_at - self.refresh_margin:
+                answer = request_token(self.client_id, self.client_secret)
+                self._token = answer['access_token']
+                self._expires_at = time.time() + float(answer.get('expires_in', 3600))
+                self.refreshes += 1
+            return self._token
+
+    def invalidate(self, token):
+        """Drop `token` after a 401, unless another worker already replaced it."""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+TOKENS = TokenManager()
+
+ENTITY_CACHE = None  # Optional icd_entity_cache.EntityCache read through by query_icd
+
+RELEASE_METADATA_PATH = None  # Optional JSON file memoizing ICDWalker.resolve_release across runs
+LATEST_RELEASE_TTL = 24 * 3600  # Seconds before asking the API again which release is the latest
+
 class ICDWalker:
     # DB base path
     API_BASE_PATH = "https://id.who.int/"
@@ -26,13 +96,16 @@ class ICDWalker:
     LINEARIZATIONS = Literal['mms']
     API_VERSIONS = Literal['v1', 'v2']
 
-    def __init__(self, release='latest', icd_version: ICD_VERSIONS = 11, linearization: LINEARIZATIONS = 'mms', lang = 'en', api_version: API_VERSIONS ='v2'):
-        self.token = self.setup_api()
+    # Concurrent requests of a walk
+    MAX_WORKERS = 16
 
-        if release == 'latest':
-            self.root_uri = self.get_latest_release(icd_version, linearization)
-        else:
-            self.root_uri = f"{self.API_BASE_PATH}/icd/release/{icd_version}/{release}/{linearization}"
+    def __init__(self, release='latest', icd_version: ICD_VERSIONS = 11, linearization: LINEARIZATIONS = 'mms', lang = 'en', api_version: API_VERSIONS ='v2', max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+
+        # Resolved once, the release id (e.g. '2024-01') is what cached entities are tied to
+        self.release_metadata = self.resolve_release(release, icd_version, linearization)
+        self.root_uri = self.release_metadata['root_uri']
+        self.release_id = self.release_metadata['release_id']
 
         self.lang = lang
         self.api_version = api_version
@@ -46,28 +119,36 @@ class ICDWalker:
 
     @staticmethod
     def setup_api(client_id=None, client_secret=None):
-        # Setting
-        token_endpoint = 'https://icdaccessmanagement.who.int/connect/token'
-        client_id = client_id if client_id else os.getenv('ICD_CLIENT_ID')
-        client_secret = client_secret if client_secret else os.getenv('ICD_CLIENT_SECRET')
-        scope = 'icdapi_access'
-        grant_type = 'client_credentials'
-
-        # set data to post
-        payload = {'client_id': client_id, 
-                'client_secret': client_secret, 
-                'scope': scope, 
-                'grant_type': grant_type}
-                
-        # make request
-        r = requests.post(token_endpoint, data=payload, verify=True).json()
-        return r['access_token']
+        return request_token(client_id, client_secret)['access_token']
 
     @staticmethod
-    def query_icd(uri, lang='en', version='v2', token=None):
+    def query_icd(uri, lang='en', version='v2', token=None, release=None):
+        """
+        Query an ICD entity, with the shared TOKENS unless a `token` is given. Entities of a
+        known `release` are read through ENTITY_CACHE when one is configured.
+        """
+        if ENTITY_CACHE is not None and release is not None:
+            data = ENTITY_CACHE.get(uri, lang, version, release)
+            if data is None:
+                data = ICDWalker.query_icd(uri, lang, version, token)
+                ENTITY_CACHE.put(uri, lang, version, release, data)
+            return data
+
         if token is None:
-            token = ICDWalker.setup_api()
+            token = TOKENS.get()
+            response = ICDWalker._get_icd(uri, lang, version, token)
+            if response.status_code == 401:
+                # Revoked or expired early: renew once and retry
+                TOKENS.invalidate(token)
+                response = ICDWalker._get_icd(uri, lang, version, TOKENS.get())
+        else:
+            response = ICDWalker._get_icd(uri, lang, version, token)
+        response.raise_for_status()  # Raise an error for bad responses
+
+        return response.json()
 
+    @staticmethod
+    def _get_icd(uri, lang, version, token):
         # HTTP header fields to set
         headers = {'Authorization':  'Bearer '+token, 
                 'Accept': 'application/json', 
@@ -77,10 +158,7 @@ class ICDWalker:
         # Make sure we run https requests
         sanitized_uri = uri.replace('http', 'https') if not 'https' in uri else uri
 
-        response = requests.get(sanitized_uri, headers=headers, verify=True)  # Set verify=True for SSL verification
-        response.raise_for_status()  # Raise an error for bad responses
-
-        return response.json()
+        return transport.get(sanitized_uri, headers=headers, verify=True)  # Set verify=True for SSL verification
     
     @staticmethod
     def get_latest_release(icd_version, linearization=None):
@@ -92,6 +170,46 @@ class ICDWalker:
     def get_available_languages(uri):
         return ICDWalker.query_icd(uri)['availableLanguages']
 
+    @staticmethod
+    def resolve_release(release='latest', icd_version=11, linearization='mms'):
+        """
+        Resolve the root URI, release id and available languages of a release, memoized in
+        RELEASE_METADATA_PATH when set. A release's metadata never changes once published;
+        which release is the latest is asked again after LATEST_RELEASE_TTL.
+
+        :Return: Dictionary with root_uri, release_id and available_languages.
+        """
+        metadata = {'latest': {}, 'releases': {}}
+        if RELEASE_METADATA_PATH and os.path.exists(RELEASE_METADATA_PATH):
+            with open(RELEASE_METADATA_PATH, 'r') as f:
+                metadata = json.load(f)
+
+        if release == 'latest':
+            key = f"{icd_version}/{linearization}"
+            latest = metadata['latest'].get(key)
+            if latest is None or time.time() - latest['resolved_at'] >= LATEST_RELEASE_TTL:
+                latest = {'root_uri': ICDWalker.get_latest_release(icd_version, linearization), 'resolved_at': time.time()}
+                metadata['latest'][key] = latest
+            root_uri = latest['root_uri']
+        else:
+            root_uri = f"{ICDWalker.API_BASE_PATH}icd/release/{icd_version}/{release}/{linearization}"
+
+        if root_uri not in metadata['releases']:
+            match = re.search(r'/release/\d+/([^/]+)', root_uri)
+            metadata['releases'][root_uri] = {
+                'root_uri': root_uri,
+                'release_id': match.group(1) if match else None,
+                'available_languages': ICDWalker.get_available_languages(root_uri)
+            }
+
+        if RELEASE_METADATA_PATH:
+            os.makedirs(os.path.dirname(os.path.abspath(RELEASE_METADATA_PATH)), exist_ok=True)
+            with open(RELEASE_METADATA_PATH + '.tmp', 'w') as f:
+                json.dump(metadata, f, indent=4)
+            os.replace(RELEASE_METADATA_PATH + '.tmp', RELEASE_METADATA_PATH)
+
+        return metadata['releases'][root_uri]
+
     # -------------------------------- Properties -------------------------------- #
     
     def set_lang(self, lang):
@@ -102,7 +220,7 @@ class ICDWalker:
 
     @property
     def available_languages(self):
-        return self.get_available_languages(self.root_uri)
+        return self.release_metadata['available_languages']
 
     def get_dataframes(self, lang):
         """Convert the collected data into a pandas DataFrame."""
@@ -114,11 +232,6 @@ class ICDWalker:
 
     # ---------------------------------------------------------------------------- #
 
-    def _pause_crawl(self):
-        time.sleep(60)
-        self.walk_start_time = time.time()
-        self.token = self.setup_api()
-
     def _extract_ids(self, data, key):
         return [os.path.basename(e) for e in data[key]] if key in data else None
 
@@ -130,8 +243,7 @@ class ICDWalker:
         else:
             raise ValueError(f'Unrecognized type {type}.')
 
-    def _get_foundation_data(self, uri):
-        foundation_data = self.query_icd(uri, self.lang, self.api_version, self.token) if uri else {}
+    def _get_foundation_data(self, foundation_data: dict):
         return {
             'fully_specified_name': self._get_from_data(foundation_data, 'fullySpecifiedName'),
             'synonym': self._get_from_data(foundation_data, 'synonym', type='list'),
@@ -158,7 +270,7 @@ class ICDWalker:
             **{os.path.basename(s['@id']): s.get('scaleEntity') for s in data.get('postcoordinationScale', {})}
         }
     
-    def _get_chapter_data(self, data: dict) -> dict:
+    def _get_chapter_data(self, data: dict, foundation_data: dict) -> dict:
         return {
             'code': data.get('code'),
             'title': self._get_from_data(data, 'title'),
@@ -167,12 +279,12 @@ class ICDWalker:
             'parent': data.get('parent'),
             'index_terms': self._get_from_data(data, 'indexTerm', type='list'),
             'foundation_child_elsewhere': self._get_from_data(data, 'foundationChildElsewhere', type='list'),
-            **self._get_foundation_data(data.get('source')),
+            **self._get_foundation_data(foundation_data),
             'f_uri': data.get('source'),
             'uri': data['@id'],
         }
 
-    def _get_category_data(self, data: dict, chapter_data: dict) -> dict:
+    def _get_category_data(self, data: dict, chapter_data: dict, foundation_data: dict) -> dict:
         return {
             'code': data.get('code'),
             'chapter': chapter_data['code'],
@@ -182,56 +294,197 @@ class ICDWalker:
             'parent': data.get('parent'),
             'index_terms': self._get_from_data(data, 'indexTerm', type='list'),
             'foundation_child_elsewhere': self._get_from_data(data, 'foundationChildElsewhere', type='list'),
-            **self._get_foundation_data(data.get('source')),
+            **self._get_foundation_data(foundation_data),
             'f_uri': data.get('source'),
             'uri': data['@id'],
         }
 
-    def _walk(self, uri, chapter_data=None, show_progress_bars=True, verbose=False, level=0):
-        # Restart every ~3mins
-        if time.time() - self.walk_start_time >= 180:
-            self._pause_crawl()
-
-        data = self.query_icd(uri, self.lang, self.api_version, self.token)
-        indent = '  ' * level  # Create an indent based on the depth
-        
-        if data.get('classKind') == 'chapter':
-            chapter_data = self._get_chapter_data(data)
-            self.chapter[self.lang].append(chapter_data)
-
-        elif data.get('classKind') == 'category':
-            # Gather category's data
-            category_data = self._get_category_data(data, chapter_data)
-            self.category[self.lang].append(category_data)
-
-            # Gather category's postcoordination
-            postcoordination = self._get_postcoordination(data)
-            self.postcoordination[self.lang].append(postcoordination)
-
-            if verbose:
-                self.print_data(data, chapter_data, indent)
-        
-        if verbose and 'title' in data:
-            print(f"{indent}{data['title']['@value']}")  # Print the title entry if verbose
-                
-        # Assuming 'children' is a key that contains the URIs of child resources
-        if 'child' in data:
-            for child_uri in tqdm(data['child'], desc='Processing chapters...') if level == 0 and show_progress_bars else data['child']:
-                self._walk(child_uri, chapter_data, show_progress_bars, verbose, level + 1)  # Increase level for indentation
-                # TODO: remove, for debug purposes
-                # if level != 0:
-                #     break
-
-    def walk(self, uri=None, show_progress_bars=True, verbose=False):
+    def _query(self, uri, lang=None):
+        return self.query_icd(uri, lang or self.lang, self.api_version, release=self.release_id)
+
+    def _fetch_node(self, uri, lang):
+        """Fetch a linearization entity and, for a chapter or a category, its foundation entity."""
+        data = self._query(uri, lang)
+        source = data.get('source') if data.get('classKind') in ['chapter', 'category'] else None
+        return data, self._query(source, lang) if source else {}
+
+    def _iter_nodes(self, uri=None, langs=None, show_progress_bars=True):
+        """
+        Walk the tree depth-first with an explicit stack, yielding (path, {lang: (entity, foundation
+        entity)}) as each node arrives, path being the node's child indices from `uri`.
+
+        The tree is learnt from the payloads of the first of `langs` (default: the walker's).
+        Up to `4 * max_workers` nodes are fetched ahead in every language on `max_workers`
+        threads, the next ones in walk order first: the lexicographic order of the paths is the
+        depth-first order. Nodes come out in the same order as a sequential walk while only
+        that window of entities is held in memory.
+        """
         if uri is None:
             uri = self.root_uri
+        langs = langs or [self.lang]
+        window = 4 * self.max_workers
+
+        ahead = [((), uri)]  # (path, uri) of the discovered nodes not fetched yet
+        futures = {}  # path -> {lang: future} of the nodes fetched ahead
+        expanded = set()  # Paths whose children were added to `ahead`
+        walked = None  # Path of the last walked node
+
+        def expand(path):
+            expanded.add(path)
+            data, _ = futures[path][langs[0]].result()
+            for i, child_uri in enumerate(data.get('child', [])):
+                heapq.heappush(ahead, (path + (i,), child_uri))
+
+        def fetch_ahead():
+            for path, node_futures in list(futures.items()):
+                if path not in expanded and node_futures[langs[0]].done():
+                    expand(path)
+            while ahead and len(futures) < window:
+                path, next_uri = heapq.heappop(ahead)
+                if path not in futures and (walked is None or path > walked):
+                    futures[path] = {l: executor.submit(self._fetch_node, next_uri, l) for l in langs}
+
+        stack = [((), uri)]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+             tqdm(desc='Walking entities...', disable=not show_progress_bars) as pbar:
+            while stack:
+                path, node_uri = stack.pop()
+                walked = path
+                if path not in futures:
+                    futures[path] = {l: executor.submit(self._fetch_node, node_uri, l) for l in langs}
+
+                # Keep fetching ahead while waiting for the node
+                fetch_ahead()
+                while not all(future.done() for future in futures[path].values()):
+                    pending = [f for node_futures in futures.values() for f in node_futures.values() if not f.done()]
+                    wait(pending, return_when=FIRST_COMPLETED)
+                    fetch_ahead()
+                if path not in expanded:
+                    expand(path)
+                expanded.discard(path)
+
+                nodes = {l: future.result() for l, future in futures.pop(path).items()}
+                pbar.update(1)
+                yield path, nodes
+
+                # Children are popped in order
+                children = nodes[langs[0]][0].get('child', [])
+                for i in reversed(range(len(children))):
+                    stack.append((path + (i,), children[i]))
+
+    def iter_walk(self, uri=None, langs=None, show_progress_bars=True, verbose=False):
+        """
+        Walk the tree as _iter_nodes does, yielding (lang, kind, record) as each node arrives,
+        kind being 'chapter', 'category' or 'postcoordination'. Records come out in the same
+        order as a sequential walk.
+        """
+        langs = langs or [self.lang]
+        chapters = {}  # (path, lang) -> chapter record, of the few chapter nodes only
+
+        def chapter_of(path, lang):
+            for depth in range(len(path), -1, -1):
+                if (path[:depth], lang) in chapters:
+                    return chapters[(path[:depth], lang)]
+            return None
+
+        for path, nodes in self._iter_nodes(uri, langs, show_progress_bars):
+            indent = '  ' * len(path)  # Create an indent based on the depth
+            for l, (data, foundation_data) in nodes.items():
+                if data.get('classKind') == 'chapter':
+                    chapters[(path, l)] = self._get_chapter_data(data, foundation_data)
+                    yield l, 'chapter', chapters[(path, l)]
+
+                elif data.get('classKind') == 'category':
+                    # Gather category's data and postcoordination
+                    yield l, 'category', self._get_category_data(data, chapter_of(path, l), foundation_data)
+                    yield l, 'postcoordination', self._get_postcoordination(data)
+
+                    if verbose:
+                        self.print_data(data, chapter_of(path, l), indent)
+
+                if verbose and 'title' in data:
+                    print(f"{indent}{data['title']['@value']}")  # Print the title entry if verbose
 
-        # Walk
-        self.walk_start_time = time.time()
-        self._walk(uri, show_progress_bars=show_progress_bars, verbose=verbose)
-
-        return self.get_dataframes(self.lang)
+    def walk(self, uri=None, show_progress_bars=True, verbose=False):
+        return self.walk_languages([self.lang], uri, show_progress_bars, verbose)[self.lang]
+
+    def walk_languages(self, langs, uri=None, show_progress_bars=True, verbose=False):
+        """
+        Walk the tree once for all `langs`, filling their chapter, category and postcoordination rows together.
+
+        :Return: {lang: dataframes} as returned by get_dataframes.
+        """
+        rows = {'chapter': self.chapter, 'category': self.category, 'postcoordination': self.postcoordination}
+        for lang, kind, record in self.iter_walk(uri, langs, show_progress_bars, verbose):
+            rows[kind].setdefault(lang, []).append(record)
+
+        return {l: self.get_dataframes(l) for l in langs}
+
+    # ------------------------------- Release diff ------------------------------- #
+
+    def diff_release(self, previous_release, langs, show_progress_bars=True):
+        """
+        Compare this walker's release with `previous_release`, whose entities must be in ENTITY_CACHE.
+
+        The API exposes no change history, so nothing can be skipped: the new tree is walked in
+        every language of `langs`, with the foundation entities of its chapters and categories,
+        and costs as many requests as a full walk. Each node is compared, as it arrives, with the
+        payloads of the same URI and language in the previous release, so only the walk's window
+        of entities is held in memory. The payloads are cached under the new release, so a
+        following walk_languages is answered from the cache without querying the API again.
+
+        :Return: Changelog with the added, removed and modified entities (code, title, uri), the
+                 modified ones listing the languages of their changed payloads and foundation payloads.
+        """
+        if ENTITY_CACHE is None:
+            raise ValueError('Release diffing needs an ENTITY_CACHE holding the previous release.')
+
+        def to_previous(uri):
+            return uri.replace(f"/{self.release_id}/", f"/{previous_release}/")
+
+        def from_previous(data):
+            return json.loads(json.dumps(data).replace(f"/{previous_release}/", f"/{self.release_id}/"))
+
+        def changed_langs(uri, previous_uri, payloads):
+            changed = []
+            for l in langs:
+                previous = ENTITY_CACHE.get(previous_uri, l, self.api_version, previous_release)
+                if previous is None or from_previous(previous) != payloads[l]:
+                    changed.append(l)
+            return changed
+
+        def summary(data):
+            return {'code': data.get('code'), 'title': self._get_from_data(data, 'title'), 'uri': data.get('@id')}
+
+        structure_lang = langs[0]
+        changelog = {'from_release': previous_release, 'to_release': self.release_id, 'added': [], 'removed': [], 'modified': []}
+
+        for path, nodes in self._iter_nodes(self.root_uri, langs, show_progress_bars):
+            if not path:
+                continue  # The release itself, whose id and date always change
+            data, _ = nodes[structure_lang]
+            uri = data['@id']
+            if not ENTITY_CACHE.contains(to_previous(uri), structure_lang, self.api_version, previous_release):
+                changelog['added'].append(summary(data))
+                continue
+
+            langs_changed = changed_langs(uri, to_previous(uri), {l: entity for l, (entity, _) in nodes.items()})
+            source = data.get('source') if data.get('classKind') in ['chapter', 'category'] else None
+            foundation_langs_changed = changed_langs(source, source, {l: foundation for l, (_, foundation) in nodes.items()}) if source else []
+            if langs_changed or foundation_langs_changed:
+                changelog['modified'].append({**summary(data), 'langs': langs_changed, 'foundation_langs': foundation_langs_changed})
+
+        # Every entity of the new tree was cached under the new release while walking it
+        for previous_uri in ENTITY_CACHE.linearization_uris(previous_release, structure_lang, self.api_version):
+            new_uri = previous_uri.replace(f"/{previous_release}/", f"/{self.release_id}/")
+            if previous_uri != to_previous(self.root_uri) and not ENTITY_CACHE.contains(new_uri, structure_lang, self.api_version, self.release_id):
+                previous = ENTITY_CACHE.get(previous_uri, structure_lang, self.api_version, previous_release)
+                changelog['removed'].append(summary(previous))
+
+        return changelog
 
+    # ---------------------------------------------------------------------------- #
 
     def print_data(self, data, chapter_data, indent=''):
         print(f"{indent} > Keys: {list(data.keys())}")
@@ -252,7 +505,20 @@ def _args():
     parser.add_argument('--linearization', type=str, choices=get_args(ICDWalker.LINEARIZATIONS), default='mms')
     parser.add_argument('--icd-version', type=int, choices=get_args(ICDWalker.ICD_VERSIONS), default=11)
     parser.add_argument('--api-version', type=str, choices=get_args(ICDWalker.API_VERSIONS), default='v2')
+    parser.add_argument('--workers', type=int, default=ICDWalker.MAX_WORKERS, help="Concurrent requests of a walk, keep it under the API rate limit.")
+
+    parser.add_argument('--rate', type=float, default=None, help="Initial requests/second to the API, adapted to its throttling.")
+    parser.add_argument('--max-rate', type=float, default=None, help="Maximum requests/second to the API.")
+    parser.add_argument('--no-rate-limit', action='store_true', help="Send requests as fast as the workers allow.")
+
+    parser.add_argument('--entity-cache', type=str, default='../icd_cache/entities.sqlite', help="SQLite store of the fetched ICD entities, reused across languages and runs.")
+    parser.add_argument('--no-entity-cache', action='store_true', help="Always query the API, without the entity and release metadata caches.")
+    parser.add_argument('--release-metadata', type=str, default='../icd_cache/release_metadata.json', help="JSON file memoizing the latest release and the languages of each release.")
+
+    parser.add_argument('--purge-old-releases', action='store_true', help="Drop the cached entities of every other release once this one is walked, e.g. after a successful --diff-from.")
+    parser.add_argument('--diff-from', type=str, default=None, help="Release id (e.g. 2024-01) in the entity cache to diff against: a changelog of the entities added, removed and modified in any language is written. The diff walks the whole new release, it saves no request; the walk that follows is then served from the entity cache.")
 
+    parser.add_argument('--shard-dir', type=str, default='../icd_shards', help="Parquet shards written during the walk, usable even if it is interrupted.")
     parser.add_argument('--output-dir', type=str, default=None, help="In case you want to save locally.")
     parser.add_argument('--hf-repo', type=str, default=None, help="In case you want to push to HF hub.")
 
@@ -261,13 +527,23 @@ def _args():
 if __name__ == "__main__":
     # Get arguments
     args = _args()
+    if args.diff_from and args.no_entity_cache:
+        raise ValueError('--diff-from needs the entity cache holding the previous release.')
+
+    # One keep-alive connection per walker thread, paced by the API's throttling
+    transport.configure(pool_size=args.workers, rate=args.rate, max_rate=args.max_rate, rate_limit=not args.no_rate_limit)
+
+    if not args.no_entity_cache:
+        ENTITY_CACHE = EntityCache(args.entity_cache)
+        RELEASE_METADATA_PATH = args.release_metadata
 
     # Instantiate the walker
     walker = ICDWalker(
         release=args.release, 
         icd_version=args.icd_version, 
         linearization=args.linearization,
-        api_version=args.api_version
+        api_version=args.api_version,
+        max_workers=args.workers
     )
 
     langs = walker.available_languages if args.lang == 'all' else args.lang.split(',')
@@ -275,16 +551,35 @@ if __name__ == "__main__":
     
     script_start = time.time()
 
+    if args.diff_from:
+        changelog = walker.diff_release(args.diff_from, langs)
+        changelog_dir = args.output_dir if args.output_dir else os.path.dirname(os.path.abspath(args.entity_cache))
+        os.makedirs(changelog_dir, exist_ok=True)
+        changelog_path = os.path.join(changelog_dir, f'changelog_{args.diff_from}_to_{walker.release_id}.json')
+        with open(changelog_path, 'w') as f:
+            json.dump(changelog, f, indent=4, ensure_ascii=False)
+        print(f"Release {args.diff_from} -> {walker.release_id}: {len(changelog['added'])} added, "
+              f"{len(changelog['removed'])} removed, {len(changelog['modified'])} modified entities, see {changelog_path}")
+
+    # Walk the way, once for all languages, streaming the records to Parquet shards
+    shards = {
+        (cat, l): ParquetShardWriter(os.path.join(args.shard_dir, cat, l))
+        for cat in ['category', 'chapter', 'postcoordination'] for l in langs
+    }
+    try:
+        for l, cat, record in walker.iter_walk(langs=langs):
+            shards[(cat, l)].write(record)
+    finally:
+        # An interrupted walk keeps its buffered records in the shards too
+        for shard in shards.values():
+            shard.close()
+
     for l in langs:
         print(f"{'-'*30} Processing {l} {'-'*30}")
-        walker.set_lang(l)
 
-        # Walk the way
-        dataframes_l = walker.walk()
-
-        # Process each resulting df
-        for cat, dfl in dataframes_l.items():
-            dsl = Dataset.from_pandas(dfl)
+        # Process each resulting dataset
+        for cat in ['category', 'chapter', 'postcoordination']:
+            dsl = shards.pop((cat, l)).to_dataset()
 
             if args.output_dir:
                 dsl.save_to_disk(os.path.join(args.output_dir, cat, l))
@@ -295,7 +590,18 @@ if __name__ == "__main__":
             print(f'{cat}: {dsl}')
         print(f'{l} done!')
 
+    # Only once the release is fully walked: the cached releases are the snapshots the next diff needs
+    if args.purge_old_releases and ENTITY_CACHE is not None and walker.release_id:
+        removed = ENTITY_CACHE.purge(walker.release_id)
+        if removed:
+            print(f'Dropped {removed} cached entities of other releases than {walker.release_id}')
+
     script_end = time.time()
 
     print('All languages processed!')
+    transport.STATS.print_summary()
+    transport.LIMITER.print_summary()
+    print(f'Tokens requested: {TOKENS.refreshes}')
+    if ENTITY_CACHE is not None:
+        ENTITY_CACHE.print_summary()
     print(f'Time: {(script_end - script_start)/60} minutes')
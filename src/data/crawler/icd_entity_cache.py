@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+class EntityCache:
+    """
+    Persistent store of ICD API entities keyed by (uri, lang, api_version, release).
+
+    Payloads are stored once under the SHA-256 of their JSON, so the many keys answering the
+    same content (a foundation entity shared by several categories, a language falling back
+    to English) take the space of one. Entries are only valid for the release they were
+    fetched in, and kept as the snapshot a later release is diffed against: `purge` drops those
+    of every other release when asked to.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entities ('
+            'uri TEXT, lang TEXT, api_version TEXT, release TEXT, sha256 TEXT, '
+            'PRIMARY KEY (uri, lang, api_version, release))'
+        )
+        self._db.execute('CREATE TABLE IF NOT EXISTS payloads (sha256 TEXT PRIMARY KEY, data TEXT)')
+        self._db.commit()
+
+    def get(self, uri, lang, api_version, release):
+        """Return the cached entity as a dict, None if it was never fetched for this release."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT data FROM entities JOIN payloads USING (sha256) '
+                'WHERE uri = ? AND lang = ? AND api_version = ? AND release = ?',
+                (uri, lang, api_version, release)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def contains(self, uri, lang, api_version, release):
+        """Whether an entity is cached for a release, without reading its payload nor counting a hit or miss."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT 1 FROM entities WHERE uri = ? AND lang = ? AND api_version = ? AND release = ?',
+                (uri, lang, api_version, release)
+            ).fetchone()
+        return row is not None
+
+    def put(self, uri, lang, api_version, release, data):
+        payload = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        sha256 = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        with self._lock:
+            self._db.execute('INSERT OR IGNORE INTO payloads VALUES (?, ?)', (sha256, payload))
+            self._db.execute(
+                'INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)', (uri, lang, api_version, release, sha256)
+            )
+            self._db.commit()
+
+    def linearization_uris(self, release, lang, api_version):
+        """Return the URIs of the linearization entities (not the foundation ones) cached for a release."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT uri FROM entities WHERE release = ? AND lang = ? AND api_version = ? AND uri LIKE '%/release/%'",
+                (release, lang, api_version)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self, keep_release):
+        """Drop the entities of every release but `keep_release`, and the payloads nobody refers to anymore."""
+        with self._lock:
+            removed = self._db.execute('DELETE FROM entities WHERE release != ?', (keep_release,)).rowcount
+            self._db.execute('DELETE FROM payloads WHERE sha256 NOT IN (SELECT sha256 FROM entities)')
+            self._db.commit()
+        return removed
+
+    def print_summary(self):
+        with self._lock:
+            nbr_entities = self._db.execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+            nbr_payloads = self._db.execute('SELECT COUNT(*) FROM payloads').fetchone()[0]
+        print(f"ICD entity cache ({nbr_entities} entities, {nbr_payloads} distinct payloads): "
+              f"{self.hits} hits, {self.misses} misses")
@@ -1,110 +1,340 @@
 import argparse
+import hashlib
 import requests
-from bs4 import BeautifulSoup
 import os
 import re
 import time
 import json
 import threading
-from io import BytesIO
+import itertools
+import asyncio
+import multiprocessing
+import sys
+import tempfile
+import aiohttp
 import PyPDF2
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datasets import Dataset
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import transport
+import html_extract
+import iris_harvest
+from http_cache import HTTPCache, CacheMiss
+from crawl_state import CrawlFrontier, DONE, FAILED
+from dedup import DedupIndex, canonicalize_url
+from work_queue import WorkQueue
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_writer import StreamingDatasetWriter
 
 # Global variables
+IRIS_BASE_URL = "https://iris.who.int"
 PDF_STORAGE_PATH = "../pdf_who"  
 JSON_STORAGE_PATH = "../json_who" 
-PDF_DATASET = {}
+PDF_DATASET = {}  # Title -> distinct extracted texts of read mode when no FRONTIER persists them
+FRONTIER = None  # Optional crawl_state.CrawlFrontier checkpointing the crawl
+DEDUP = DedupIndex()  # Handles and PDFs already processed, nothing is fetched twice
+DOCUMENT_PAGES = {}  # Canonical handle -> parsed document page, each page is fetched once per crawl
+_document_tasks = {}  # Async engine counterpart of DOCUMENT_PAGES, holding the shared fetch tasks
+EXTRACTION_POOL = None  # Optional ProcessPoolExecutor running the CPU-bound PDF text extraction of read mode
 stop_crawling = False  # Flag to control crawling
 MAX_WORKERS = 16
+MAX_CONCURRENCY = 64  # Async engine: open connections across all hosts
+PER_HOST_CONCURRENCY = 16  # Async engine: open connections to a single host
+CHUNK_SIZE = 1 << 20  # PDFs are streamed to disk 1 MiB at a time
+RECORDS_PER_PAGE = 10  # Harvested records standing for one discover page, like its rpp=10
+
+transport.configure(pool_size=MAX_WORKERS)
 
 def sanitize_filename(filename):
     """Replace invalid characters in filename with underscores."""
     return re.sub(r'[<>:"/\\|?*]', '_', filename)
 
+def pdf_title(pdf_url):
+    """Build the sanitized file name used to store a PDF."""
+    title = pdf_url.split("/")[-1].split("?")[0]
+    return sanitize_filename(title)
+
+def parse_listing_page(content):
+    """Return the set of document page URLs linked from a discover listing page."""
+    document_links = set()
+    for href in html_extract.listing_links(content):
+        document_url = f"{IRIS_BASE_URL}{href}"
+        document_links.add(document_url)
+        print(f"Document Link Found: {document_url}")
+    return document_links
+
+def parse_document_page(content, document_url, get_children=True):
+    """Return the PDF URLs and the child language pages linked from a document page."""
+    # Every link of the item view, extracted in a single pass
+    hrefs = html_extract.item_view_links(content)
+
+    # Links to PDFs on the main page
+    main_urls = []
+    for href in hrefs:
+        if 'pdf' in href.lower():
+            pdf_url = f"{IRIS_BASE_URL}{href}"
+            print(f"PDF FOUND: {pdf_url}")
+            main_urls.append(pdf_url)
+
+    document_links = set()
+    if get_children:
+        pattern = re.compile(re.escape(IRIS_BASE_URL) + r"/handle/10665/\d+")
+        for href in hrefs:
+            if pattern.match(href):
+                children_url = f"{href}"
+                print(f"CHILDREN PAGE FOUND: {children_url}")
+                if children_url != document_url:
+                    document_links.add(children_url)
+
+    return main_urls, document_links
+
+def iter_pdf_page_texts(pdf_file):
+    """
+    Yield the text of every page of a PDF file object, each page extracted once, one at a time.
+    Lone surrogates are removed here, before the text reaches the frontier, which cannot encode them.
+    """
+    reader = PyPDF2.PdfReader(pdf_file)
+    for page in reader.pages:
+        yield remove_invalid_character(page.extract_text() or '')
+
+def spool_pdf_text(path, text_path):
+    """Write the text of a PDF file to the file at `text_path`, a page at a time."""
+    # A path given to PdfReader would be read into memory, an open file is seeked
+    with open(path, 'rb') as f, open(text_path, 'w', encoding='utf-8') as out:
+        for text in iter_pdf_page_texts(f):
+            out.write(text)
+
+def extract_text_from_pdf_file(path, pool=None):
+    """
+    Extract the text of a PDF file, on `pool` when given. The pages are spooled to a text
+    file next to the PDF and read back once, so neither a list of pages nor a pickled copy
+    of the text is held on top of the document text that is returned.
+    """
+    text_path = f"{path}.txt"
+    try:
+        if pool is not None:
+            pool.submit(spool_pdf_text, path, text_path).result()
+        else:
+            spool_pdf_text(path, text_path)
+        with open(text_path, encoding='utf-8') as f:
+            return f.read()
+    finally:
+        if os.path.exists(text_path):
+            os.remove(text_path)
+
+def create_extraction_pool(max_workers=None):
+    """
+    Process pool for PDF text extraction, which is CPU-bound and serialized by the GIL on threads.
+    Workers are spawned rather than forked since the crawler's threads may hold locks at fork time.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+def pdf_storage_paths(title, pdf_url):
+    """
+    Return the final path of a downloaded PDF and the partial path it is streamed to. The
+    partial file is named after the URL, not the title, since bitstreams of different
+    handles can share a file name and must never resume each other's bytes.
+    """
+    os.makedirs(PDF_STORAGE_PATH, exist_ok=True)
+    file_path = os.path.join(PDF_STORAGE_PATH, f"{title}")
+    url_hash = hashlib.sha256(canonicalize_url(pdf_url).encode('utf-8')).hexdigest()[:32]
+    return file_path, os.path.join(PDF_STORAGE_PATH, f".{url_hash}.part")
+
+def partial_size(part_path):
+    return os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+def discard_partial(part_path):
+    for path in [part_path, part_path + '.validator']:
+        if os.path.exists(path):
+            os.remove(path)
+
+def resume_headers(part_path, entry):
+    """
+    Return the offset to resume a partial file from and the headers of the request.
+
+    A partial file is only resumed with an If-Range on the validator of the response it
+    started from, so a PDF changed upstream is sent whole (200) instead of appended to the
+    old bytes. A partial file without a validator cannot be resumed safely and starts over.
+    """
+    offset = partial_size(part_path)
+    validator_path = part_path + '.validator'
+    if offset and os.path.exists(validator_path):
+        with open(validator_path) as f:
+            return offset, {'Range': f'bytes={offset}-', 'If-Range': f.read()}
+    if offset:
+        discard_partial(part_path)
+    return 0, HTTPCache.conditional_headers(entry)
+
+def response_validator(headers):
+    """Validator usable in an If-Range: a strong ETag, else the Last-Modified date."""
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+def open_partial(part_path, offset, status, content_range, validator=None):
+    """
+    Open the partial file for writing and return it with a SHA-256 primed with the bytes it keeps.
+
+    The existing bytes are kept only when the server answered 206 starting at `offset`,
+    a 200 restarts the file from scratch, remembering the `validator` of the response for
+    a later resume, and any other partial answer is rejected.
+    """
+    sha256 = hashlib.sha256()
+    if status != 206:
+        discard_partial(part_path)
+        if validator:
+            with open(part_path + '.validator', 'w') as f:
+                f.write(validator)
+        return open(part_path, 'wb'), sha256
+
+    if not offset or not (content_range or '').startswith(f"bytes {offset}-"):
+        discard_partial(part_path)
+        raise ValueError(f"Unexpected Content-Range {content_range!r} when resuming from byte {offset}")
+
+    with open(part_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return open(part_path, 'ab'), sha256
+
 def extract_pdf_text(pdf_url):
-    """Extract text from a PDF at the provided URL and return the PDF name and text."""
+    """
+    Extract text from a PDF at the provided URL and return the PDF name and text.
+
+    The PDF is spooled to a temporary file, which the extraction reads a page at a time, so
+    no process holds the whole PDF in memory. The text is returned whole, the record of the
+    document, so it is held once.
+    """
+    pdf_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    pdf_file.close()
     try:
-        pdf_response = requests.get(pdf_url)
-        pdf_response.raise_for_status()  
-        
-        title = pdf_url.split("/")[-1].split("?")[0]
-        title = sanitize_filename(title)
-
-        pdf_file = BytesIO(pdf_response.content)
-        reader = PyPDF2.PdfReader(pdf_file)
-        pdf_text = ''
-        for page in reader.pages:
-            pdf_text += page.extract_text() if page.extract_text() else '' 
+        transport.get_to_file(pdf_url, pdf_file.name, CHUNK_SIZE)
+
+        title = pdf_title(pdf_url)
+        # With a pool, the calling thread only waits, the parsing runs on another core
+        pdf_text = extract_text_from_pdf_file(pdf_file.name, EXTRACTION_POOL)
         
         return {'title': title, 'pdf_text': pdf_text}
 
     except requests.exceptions.RequestException as e:
         print(f"Error downloading PDF from {pdf_url}: {e}")
-        return {'title': pdf_url.split('/')[-1], 'pdf_text': ''}
+        return {'title': pdf_url.split('/')[-1], 'pdf_text': '', 'error': str(e)}
     except Exception as e:
         print(f"Error extracting text from PDF {pdf_url}: {e}")
-        return {'title': pdf_url.split('/')[-1], 'pdf_text': ''}
+        return {'title': pdf_url.split('/')[-1], 'pdf_text': '', 'error': str(e)}
+    finally:
+        os.remove(pdf_file.name)
     
+def cached_download(pdf_url, file_path):
+    """Return the cache entry of a PDF already downloaded at `file_path`, None when it has to be fetched."""
+    if transport.CACHE is None or not os.path.exists(file_path):
+        return None
+    entry = transport.CACHE.lookup(pdf_url)
+    return entry if entry and entry['path'] == file_path else None
+
+def keep_download(title, entry):
+    """Reuse a PDF downloaded by an earlier run, unchanged upstream or replayed offline."""
+    transport.CACHE.record_hit()
+    print(f"Unchanged, kept: {entry['path']}")
+    return {'title': title, 'path': entry['path'], 'sha256': entry['sha256']}
+
+def finish_download(pdf_url, title, file_path, part_path, sha256, headers):
+    """Move a complete partial file in place and remember its validators for the next run."""
+    os.replace(part_path, file_path)
+    discard_partial(part_path)
+    if transport.CACHE is not None:
+        transport.CACHE.record_miss()
+        transport.CACHE.store_external(pdf_url, headers, file_path, sha256.hexdigest())
+    print(f"Downloaded and saved at: {file_path} (sha256 {sha256.hexdigest()})")
+    return {'title': title, 'path': file_path, 'sha256': sha256.hexdigest()}
+
 def download_pdf(pdf_url):
-    """Download PDF manually to a given directory."""
-    try:
+    """
+    Stream a PDF to PDF_STORAGE_PATH and return its title, path and SHA-256.
 
-        pdf_response = requests.get(pdf_url)
-        pdf_response.raise_for_status()  # Raise an error if the response status is not OK
-        
-        # Extract a sanitized title from the URL
-        title = pdf_url.split("/")[-1].split("?")[0]
-        title = sanitize_filename(title)
-
-        # Save the PDF file to the PDF_STORAGE_PATH
-        pdf_file = BytesIO(pdf_response.content)
-        os.makedirs(PDF_STORAGE_PATH, exist_ok=True)
-
-        file_path = os.path.join(PDF_STORAGE_PATH, f"{title}")
-        print(f"Downloading and saving at: {file_path}")
-        with open(file_path, "wb") as f:
-            f.write(pdf_file.getbuffer())
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading PDF from {pdf_url}: {e}")
+    Chunks are written to a '.part' file that is renamed once complete, so memory stays at
+    CHUNK_SIZE whatever the PDF size. A '.part' left by an interrupted transfer or an earlier
+    run is resumed with an HTTP Range request conditioned by If-Range. With a response cache configured, a PDF
+    kept from an earlier run is only revalidated.
+    """
+    title = pdf_title(pdf_url)
+    file_path, part_path = pdf_storage_paths(title, pdf_url)
+
+    entry = cached_download(pdf_url, file_path)
+    if transport.CACHE is not None and transport.CACHE.offline:
+        if entry is None:
+            print(f"Error downloading PDF from {pdf_url}: not in the offline cache")
+            return None
+        return keep_download(title, entry)
+
+    for attempt in range(transport.MAX_RETRIES + 1):
+        offset, headers = resume_headers(part_path, entry)
+        try:
+            with transport.get(pdf_url, headers=headers, stream=True) as pdf_response:
+                if pdf_response.status_code == 304 and entry is not None:
+                    return keep_download(title, entry)
+                if pdf_response.status_code == 416:
+                    # The partial file is longer than the remote one, start over
+                    discard_partial(part_path)
+                    continue
+                pdf_response.raise_for_status()  # Raise an error if the response status is not OK
+
+                f, sha256 = open_partial(part_path, offset, pdf_response.status_code, pdf_response.headers.get('Content-Range'),
+                                         response_validator(pdf_response.headers))
+                try:
+                    with f:
+                        for chunk in pdf_response.iter_content(chunk_size=CHUNK_SIZE):
+                            sha256.update(chunk)
+                            f.write(chunk)
+                except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as e:
+                    # Keep what was received in the partial file and resume from there
+                    if attempt == transport.MAX_RETRIES:
+                        raise
+                    print(f"Transfer of {pdf_url} interrupted at byte {partial_size(part_path)}, resuming: {e}")
+                    transport.STATS.record_retry(pdf_url)
+                    time.sleep(transport.backoff_delay(attempt))
+                    continue
+
+            return finish_download(pdf_url, title, file_path, part_path, sha256, pdf_response.headers)
+
+        except (requests.exceptions.RequestException, ValueError, OSError) as e:
+            print(f"Error downloading PDF from {pdf_url}: {e}")
+            return None
+
+    print(f"Error downloading PDF from {pdf_url}: gave up after {transport.MAX_RETRIES + 1} attempts")
+    return None
+
+def fetch_document_page(document_url):
+    """Fetch and parse a document page, at most once per crawl whether it is reached as a result or as a child."""
+    key = canonicalize_url(document_url)
+    if key not in DOCUMENT_PAGES:
+        response = transport.get(document_url)
+        response.raise_for_status()  
+        DOCUMENT_PAGES[key] = parse_document_page(response.content, document_url)
+    return DOCUMENT_PAGES[key]
+
+def store_pdf_text(title, pdf_text):
+    """Keep an extracted text for the dataset, in memory only when no frontier persists it."""
+    if FRONTIER is None:
+        # Bitstreams of different handles can share a file name, only an identical text is dropped
+        texts = PDF_DATASET.setdefault(title, [])
+        if pdf_text not in texts:
+            texts.append(pdf_text)
 
 def crawl_document_page(document_url, get_children = True):
     """Crawl the document page to find and extract text from the PDFs."""
-    global PDF_DATASET  
     if stop_crawling:
         return  
 
     pdf_urls = {} 
-    main_urls = []
     children_urls = []
     
     try:
-        response = requests.get(document_url)
-        response.raise_for_status()  
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Select all anchor tags that link to PDFs on the main page
-        pdf_link_elements = soup.select("#aspect_artifactbrowser_ItemViewer_div_item-view a")  
-        for pdf_link_element in pdf_link_elements:
-            if 'href' in pdf_link_element.attrs and 'pdf' in pdf_link_element['href'].lower():
-                pdf_url = f"https://iris.who.int{pdf_link_element['href']}"
-                print(f"PDF FOUND: {pdf_url}")
-                main_urls.append(pdf_url)
+        main_urls, document_links = fetch_document_page(document_url)
 
         pdf_urls['mainpage'] = main_urls
 
         if get_children:
-            document_links = set()
-            language_link_elements = soup.select("#aspect_artifactbrowser_ItemViewer_div_item-view a")    
-            pattern = re.compile(r"https://iris\.who\.int/handle/10665/\d+")
-            for link in language_link_elements:
-                if 'href' in link.attrs and pattern.match(link['href']):
-                    children_url = f"{link['href']}"
-                    print(f"CHILDREN PAGE FOUND: {children_url}")
-                    if children_url != document_url:
-                        document_links.add(children_url)
-            
             # Recursively crawl child pages to get their PDFs
             for link in document_links:
                 children_page_pdfs = crawl_document_page(link, get_children=False)['mainpage']
@@ -119,8 +349,109 @@ def crawl_document_page(document_url, get_children = True):
 
     except Exception as e:
         print(f"Error crawling document page {document_url}: {e}")
-        return {'mainpage': [], 'childrenpage': []}
+        return {'mainpage': [], 'childrenpage': [], 'error': str(e)}
     
+# ------------------------ Checkpointing and deduplication ------------------------ #
+
+def claim(url):
+    """Claim a handle or PDF in the deduplication index, False if it was already processed."""
+    if DEDUP is None or DEDUP.claim(url):
+        return True
+    print(f"Duplicate skipped: {url}")
+    return False
+
+def release(url, success):
+    if DEDUP is not None:
+        DEDUP.release(url, success)
+
+def checkpointed_crawl_document(document_url):
+    """
+    crawl_document_page, answered from the frontier when an earlier run already crawled the document.
+    Returns None for a document already processed in this crawl (or an earlier one sharing the index).
+
+    The handle stays claimed until release_document is called once its PDFs are processed:
+    released earlier, a worker dying before its PDFs would leave them to nobody, every other
+    worker skipping the handle.
+    """
+    if not claim(document_url):
+        return None
+
+    all_pdf_dict = FRONTIER.get_document(document_url) if FRONTIER is not None else None
+    if all_pdf_dict is None:
+        all_pdf_dict = crawl_document_page(document_url)
+        if FRONTIER is not None and all_pdf_dict is not None:
+            FRONTIER.record_document(document_url, all_pdf_dict)
+            FRONTIER.add_pdfs(all_pdf_dict['mainpage'])
+
+    if all_pdf_dict is None or 'error' in all_pdf_dict:
+        release(document_url, False)
+    return all_pdf_dict
+
+def pdf_succeeded(pdf_url):
+    """Whether a PDF was processed, by this worker or, as the deduplication index tells, another one."""
+    if DEDUP is not None:
+        return pdf_url in DEDUP
+    return FRONTIER is None or FRONTIER.get_pdf(pdf_url) is not None
+
+def release_document(document_url, pdf_urls):
+    """
+    Release a handle claimed by checkpointed_crawl_document once its main page PDFs were
+    processed, as done only if all of them succeeded, and return whether they did. A handle
+    kept out of the index is crawled again by the next run, which finds its failed PDFs.
+    """
+    success = not stop_crawling and all([pdf_succeeded(pdf_url) for pdf_url in pdf_urls])
+    release(document_url, success)
+    return success
+
+def checkpointed_download_pdf(pdf_url):
+    """download_pdf, skipped when the PDF was already downloaded by this crawl or an earlier run."""
+    if not claim(pdf_url):
+        return None
+
+    known = FRONTIER.get_pdf(pdf_url) if FRONTIER is not None else None
+    if known is not None and known['path'] and os.path.exists(known['path']):
+        pdf_data = known
+    else:
+        pdf_data = download_pdf(pdf_url)
+        if FRONTIER is not None:
+            if pdf_data:
+                FRONTIER.record_pdf(pdf_url, DONE, **pdf_data)
+            else:
+                FRONTIER.record_pdf(pdf_url, FAILED)
+
+    release(pdf_url, pdf_data is not None)
+    return pdf_data
+
+def checkpointed_extract_pdf_text(pdf_url):
+    """extract_pdf_text, answered from the frontier when an earlier run already extracted the PDF, None for a duplicate."""
+    if not claim(pdf_url):
+        return None
+
+    known = FRONTIER.get_pdf(pdf_url) if FRONTIER is not None else None
+    if known is not None and known['text'] is not None:
+        pdf_data = {'title': known['title'], 'pdf_text': known['text']}
+    else:
+        pdf_data = extract_pdf_text(pdf_url)
+        if FRONTIER is not None:
+            status = FAILED if 'error' in pdf_data else DONE
+            FRONTIER.record_pdf(pdf_url, status, title=pdf_data['title'], text=pdf_data['pdf_text'])
+
+    release(pdf_url, 'error' not in pdf_data)
+    return pdf_data
+
+def page_already_crawled(page_id):
+    if FRONTIER is not None and FRONTIER.page_done(page_id):
+        print(f"Page {page_id} already crawled, skipping")
+        return True
+    return False
+
+def checkpoint_page(page_id, status):
+    # A page interrupted by the user stays pending so that --resume finishes it
+    if FRONTIER is not None and not (status == DONE and stop_crawling):
+        FRONTIER.mark_page(page_id, status)
+
+# ---------------------------------------------------------------------------- #
+
 def crawl_main_page(base_url, start_page, last_page):
     """Crawl the main page to find document links and paginate through pages."""
     global stop_crawling  
@@ -128,38 +459,54 @@ def crawl_main_page(base_url, start_page, last_page):
     for page_id in range(start_page, last_page + 1):
         if stop_crawling:
             return  
+        if page_already_crawled(page_id):
+            continue
         try:
             current_url = base_url.format(page=page_id)
-            response = requests.get(current_url)
+            response = transport.get(current_url)
             response.raise_for_status()  
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            document_links = set()
-            for link in soup.select("a[href^='/handle/']"):
-                document_url = f"https://iris.who.int{link['href']}"
-                document_links.add(document_url)
-                print(f"Document Link Found: {document_url}")
-
-            pdf_urls = []
-            for document_url in document_links:
-                if stop_crawling:
-                    return  
-                pdf_url = crawl_document_page(document_url)
-                if pdf_url:
-                    pdf_urls.append(pdf_url)
-
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                future_to_pdf = {executor.submit(extract_pdf_text, pdf_url): pdf_url for pdf_url in pdf_urls}
-                
-                for future in as_completed(future_to_pdf):
-                    pdf_data = future.result()
-                    PDF_DATASET[pdf_data['title']] = pdf_data['pdf_text']
-                    print(f"Processed PDF: {pdf_data['title']}")
+            document_links = parse_listing_page(response.content)
+            if FRONTIER is not None:
+                FRONTIER.add_documents(document_links)
 
+            # Handles claimed on this page -> their main page PDFs, released once the PDFs are processed
+            documents = {}
+            documents_ok = True
+            try:
+                for document_url in document_links:
+                    if stop_crawling:
+                        return
+                    all_pdf_dict = checkpointed_crawl_document(document_url)
+                    if all_pdf_dict and 'error' in all_pdf_dict:
+                        documents_ok = False
+                    elif all_pdf_dict:
+                        documents[document_url] = all_pdf_dict['mainpage']
+                pdf_urls = [pdf_url for urls in documents.values() for pdf_url in urls]
+
+                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                    future_to_pdf = {executor.submit(checkpointed_extract_pdf_text, pdf_url): pdf_url for pdf_url in pdf_urls}
+
+                    for future in as_completed(future_to_pdf):
+                        try:
+                            pdf_data = future.result()
+                        except Exception as e:
+                            # One PDF failing must not end the page, nor the crawl
+                            print(f"Error processing PDF: {future_to_pdf[future]}: {e}")
+                            continue
+                        if pdf_data is None:
+                            continue
+                        store_pdf_text(pdf_data['title'], pdf_data['pdf_text'])
+                        print(f"Processed PDF: {pdf_data['title']}")
+            finally:
+                released = [release_document(document_url, urls) for document_url, urls in documents.items()]
+
+            # A page with a failed document or PDF stays failed, so that --resume retries them
+            checkpoint_page(page_id, DONE if documents_ok and all(released) else FAILED)
             print(f"Finished crawling page {page_id}")
 
         except Exception as e:
             print(f"Error crawling main page {current_url}: {e}")
+            checkpoint_page(page_id, FAILED)
             break  
 
 def crawl_main_page_for_downloading(base_url, id2pdfurls, start_page, last_page):
@@ -168,45 +515,426 @@ def crawl_main_page_for_downloading(base_url, id2pdfurls, start_page, last_page)
     for page_id in range(start_page, last_page + 1):
         if stop_crawling:
             return id2pdfurls  # Return early if stop_crawling is set
+        if page_already_crawled(page_id):
+            continue
         try:
             current_url = base_url.format(page=page_id)
-            response = requests.get(current_url)
+            response = transport.get(current_url)
             response.raise_for_status()  
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            document_links = set()
-            for link in soup.select("a[href^='/handle/']"):
-                document_url = f"https://iris.who.int{link['href']}"
-                document_links.add(document_url)
-                print(f"Document Link Found: {document_url}")
-
-            pdf_urls = []
-            for doc_id, document_url in enumerate(document_links):
-                if stop_crawling:
-                    return id2pdfurls  # Return early if stop_crawling is set  
-                # Crawl the page to get all PDF URLs 
-                all_pdf_dict = crawl_document_page(document_url)  
-                pdf_urls_from_doc = all_pdf_dict['mainpage'] # download only main not children
-                # Update the dict of {unique id: [pdf_urls crawl from that mainpage and childrenpage]}
-                id2pdfurls[document_url] = (all_pdf_dict['mainpage'], all_pdf_dict['childrenpage'])
-                if pdf_urls_from_doc:
-                    pdf_urls.extend(pdf_urls_from_doc)
-
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                future_to_pdf = {executor.submit(download_pdf, pdf_url): pdf_url for pdf_url in pdf_urls}
-                
-                for future in as_completed(future_to_pdf):
-                    try:
-                        pdf_data = future.result()
-                    except Exception as e:
-                        print(f"Error downloading PDF: {future_to_pdf[future]}: {e}")
+            document_links = parse_listing_page(response.content)
+            if FRONTIER is not None:
+                FRONTIER.add_documents(document_links)
+
+            # Handles claimed on this page -> their main page PDFs, released once the PDFs are downloaded
+            documents = {}
+            documents_ok = True
+            try:
+                for doc_id, document_url in enumerate(document_links):
+                    if stop_crawling:
+                        return id2pdfurls  # Return early if stop_crawling is set
+                    # Crawl the page to get all PDF URLs
+                    all_pdf_dict = checkpointed_crawl_document(document_url)
+                    if all_pdf_dict is None:
+                        continue
+                    # Update the dict of {unique id: [pdf_urls crawl from that mainpage and childrenpage]}
+                    id2pdfurls[document_url] = (all_pdf_dict['mainpage'], all_pdf_dict['childrenpage'])
+                    if 'error' in all_pdf_dict:
+                        documents_ok = False
+                    else:
+                        documents[document_url] = all_pdf_dict['mainpage']  # download only main not children
+                pdf_urls = [pdf_url for urls in documents.values() for pdf_url in urls]
+
+                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                    future_to_pdf = {executor.submit(checkpointed_download_pdf, pdf_url): pdf_url for pdf_url in pdf_urls}
 
+                    for future in as_completed(future_to_pdf):
+                        try:
+                            pdf_data = future.result()
+                        except Exception as e:
+                            print(f"Error downloading PDF: {future_to_pdf[future]}: {e}")
+            finally:
+                released = [release_document(document_url, urls) for document_url, urls in documents.items()]
+
+            # A page with a failed document or PDF stays failed, so that --resume retries them
+            checkpoint_page(page_id, DONE if documents_ok and all(released) else FAILED)
             print(f"Finished crawling page {page_id}")
         except Exception as e:
             print(f"Error crawling main page {current_url}: {e}")
+            checkpoint_page(page_id, FAILED)
             break
     return id2pdfurls
 
+# ------------------------------ Bulk harvesting ----------------------------- #
+
+def crawl_harvested(records, mode, id2pdfurls, start_page, last_page):
+    """
+    Download or read the PDFs of bulk-harvested (handle, languages, file links) records, in
+    one streaming pass that loads no listing nor item page.
+
+    Pages [start_page, last_page] select records as discover pages would, RECORDS_PER_PAGE
+    records each. Every language version is its own handle in the bulk sources, so documents
+    have no children. The handle -> languages and file links index is written as JSON Lines
+    to JSON_STORAGE_PATH.
+    """
+    records = itertools.islice(records, (start_page - 1) * RECORDS_PER_PAGE, last_page * RECORDS_PER_PAGE)
+    process = checkpointed_download_pdf if mode == 'download' else checkpointed_extract_pdf_text
+
+    os.makedirs(JSON_STORAGE_PATH, exist_ok=True)
+    index_path = os.path.join(JSON_STORAGE_PATH, f"harvest_index_from_{start_page}_to_{last_page}.jsonl")
+
+    with open(index_path, 'w') as index, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        in_flight = set()
+        for handle, languages, file_links in records:
+            if stop_crawling:
+                break
+            document_url = f"{IRIS_BASE_URL}/handle/{handle}"
+            pdf_urls = [f"{IRIS_BASE_URL}{link}" if link.startswith('/') else link for link in file_links if 'pdf' in link.lower()]
+            index.write(json.dumps({'handle': handle, 'languages': languages, 'file_links': pdf_urls}) + '\n')
+
+            if not claim(document_url):
+                continue
+            id2pdfurls[document_url] = (pdf_urls, [])
+            if FRONTIER is not None:
+                FRONTIER.record_document(document_url, {'mainpage': pdf_urls, 'childrenpage': []})
+                FRONTIER.add_pdfs(pdf_urls)
+            in_flight.add(executor.submit(process_harvested_document, document_url, pdf_urls, process))
+
+            # Keep a bounded number of PDFs in flight
+            while len(in_flight) >= 4 * MAX_WORKERS:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                harvest_results(done, mode)
+        harvest_results(in_flight, mode)
+
+    print(f"Harvest index saved to {index_path}")
+    return id2pdfurls
+
+def process_harvested_document(document_url, pdf_urls, process):
+    """Process the PDFs of a claimed handle one after the other, then release the handle."""
+    results = []
+    try:
+        for pdf_url in pdf_urls:
+            try:
+                results.append(process(pdf_url))
+            except Exception as e:
+                print(f"Error processing PDF: {pdf_url}: {e}")
+    finally:
+        release_document(document_url, pdf_urls)
+    return results
+
+def harvest_results(futures, mode):
+    for future in as_completed(futures):
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"Error processing document: {e}")
+            continue
+        for pdf_data in results:
+            if mode == 'read' and pdf_data is not None:
+                store_pdf_text(pdf_data['title'], pdf_data['pdf_text'])
+                print(f"Processed PDF: {pdf_data['title']}")
+
+# ------------------------------- Async engine ------------------------------- #
+
+async def _fetch_async(session, url, path=None, executor=None):
+    """
+    GET a URL on the shared aiohttp session and return the response body, or with `path`
+    stream it to that file, CHUNK_SIZE at a time written on `executor`, and return None.
+
+    Follows the transport retry policy and, like transport.get, revalidates against
+    or replays from the response cache when one is configured. Bodies streamed to `path`
+    bypass the cache, like in transport.get_to_file.
+    """
+    cache = transport.CACHE
+    entry = cache.lookup(url) if cache is not None and path is None else None
+    loop = asyncio.get_running_loop()
+    if cache is not None and cache.offline:
+        if entry is None:
+            raise CacheMiss(f"{url} is not in the offline cache")
+        cache.record_hit()
+        return cache.read_body(entry)
+
+    for attempt in range(transport.MAX_RETRIES + 1):
+        retry_after = None
+        start_time = time.perf_counter()
+        await transport.LIMITER.acquire_async(url)
+        try:
+            async with session.get(url, headers=HTTPCache.conditional_headers(entry)) as response:
+                content = None
+                if path is not None and response.status == 200:
+                    with open(path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            await loop.run_in_executor(executor, f.write, chunk)
+                else:
+                    content = await response.read()
+                latency = time.perf_counter() - start_time
+                transport.STATS.record_request(url, latency)
+                transport.LIMITER.record(url, response.status, latency, transport.parse_retry_after(response.headers.get('Retry-After')))
+                if response.status == 304 and entry is not None:
+                    cache.record_hit()
+                    return cache.read_body(entry)
+                if response.status not in transport.RETRY_STATUSES:
+                    response.raise_for_status()
+                    if cache is not None and path is None:
+                        cache.record_miss()
+                        cache.store(url, response.headers, content)
+                    return content
+                if attempt == transport.MAX_RETRIES:
+                    transport.STATS.record_failure(url)
+                    response.raise_for_status()
+                retry_after = transport.parse_retry_after(response.headers.get('Retry-After'))
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            transport.STATS.record_request(url, time.perf_counter() - start_time)
+            transport.LIMITER.record(url, None)
+            if attempt == transport.MAX_RETRIES:
+                transport.STATS.record_failure(url)
+                raise
+        transport.STATS.record_retry(url)
+        await asyncio.sleep(transport.backoff_delay(attempt, retry_after))
+
+async def _parse_document_page_async(session, document_url):
+    return parse_document_page(await _fetch_async(session, document_url), document_url)
+
+def _fetch_document_page_async(session, document_url):
+    """Async counterpart of fetch_document_page, concurrent callers for the same handle share one task."""
+    key = canonicalize_url(document_url)
+    if key not in _document_tasks:
+        _document_tasks[key] = asyncio.ensure_future(_parse_document_page_async(session, document_url))
+    return _document_tasks[key]
+
+async def _crawl_document_page_async(session, document_url, get_children=True):
+    """Async counterpart of crawl_document_page, child pages are fetched concurrently."""
+    if stop_crawling:
+        return {'mainpage': [], 'childrenpage': []}
+
+    try:
+        main_urls, document_links = await _fetch_document_page_async(session, document_url)
+
+        children = await asyncio.gather(
+            *(_crawl_document_page_async(session, link, get_children=False) for link in (document_links if get_children else []))
+        )
+        children_urls = [pdf_url for child in children for pdf_url in child['mainpage']]
+
+        return {'mainpage': main_urls, 'childrenpage': children_urls}
+
+    except Exception as e:
+        print(f"Error crawling document page {document_url}: {e}")
+        return {'mainpage': [], 'childrenpage': [], 'error': str(e)}
+
+async def _download_pdf_async(session, pdf_url, executor):
+    """Async counterpart of download_pdf, chunks are hashed on the loop and written on the executor."""
+    title = pdf_title(pdf_url)
+    file_path, part_path = pdf_storage_paths(title, pdf_url)
+    loop = asyncio.get_running_loop()
+
+    entry = cached_download(pdf_url, file_path)
+    if transport.CACHE is not None and transport.CACHE.offline:
+        if entry is None:
+            raise CacheMiss(f"{pdf_url} is not in the offline cache")
+        return keep_download(title, entry)
+
+    for attempt in range(transport.MAX_RETRIES + 1):
+        offset, headers = resume_headers(part_path, entry)
+        retry_after = None
+        start_time = time.perf_counter()
+        await transport.LIMITER.acquire_async(pdf_url)
+        try:
+            async with session.get(pdf_url, headers=headers) as response:
+                transport.LIMITER.record(
+                    pdf_url, response.status, time.perf_counter() - start_time,
+                    transport.parse_retry_after(response.headers.get('Retry-After'))
+                )
+                if response.status == 304 and entry is not None:
+                    transport.STATS.record_request(pdf_url, time.perf_counter() - start_time)
+                    return keep_download(title, entry)
+                if response.status == 416:
+                    # The partial file is longer than the remote one, start over
+                    discard_partial(part_path)
+                    continue
+                if response.status in transport.RETRY_STATUSES and attempt < transport.MAX_RETRIES:
+                    retry_after = transport.parse_retry_after(response.headers.get('Retry-After'))
+                else:
+                    response.raise_for_status()
+                    f, sha256 = await loop.run_in_executor(
+                        executor, open_partial, part_path, offset, response.status, response.headers.get('Content-Range'),
+                        response_validator(response.headers)
+                    )
+                    with f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            sha256.update(chunk)
+                            await loop.run_in_executor(executor, f.write, chunk)
+                    transport.STATS.record_request(pdf_url, time.perf_counter() - start_time)
+
+                    return finish_download(pdf_url, title, file_path, part_path, sha256, response.headers)
+
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+            # Whatever was received stays in the partial file and is resumed
+            if attempt == transport.MAX_RETRIES:
+                transport.STATS.record_failure(pdf_url)
+                raise
+        transport.STATS.record_request(pdf_url, time.perf_counter() - start_time)
+        transport.STATS.record_retry(pdf_url)
+        await asyncio.sleep(transport.backoff_delay(attempt, retry_after))
+
+    raise IOError(f"gave up after {transport.MAX_RETRIES + 1} attempts")
+
+async def _process_pdf_async(session, pdf_url, mode, executor):
+    """Stream a PDF to disk ('download') or spool it and extract its text off the event loop ('read')."""
+    if stop_crawling or not claim(pdf_url):
+        return
+
+    known = FRONTIER.get_pdf(pdf_url) if FRONTIER is not None else None
+    try:
+        if mode == 'download':
+            if known is not None and known['path'] and os.path.exists(known['path']):
+                release(pdf_url, True)
+                return
+            pdf_data = await _download_pdf_async(session, pdf_url, executor)
+            if FRONTIER is not None:
+                FRONTIER.record_pdf(pdf_url, DONE, **pdf_data)
+        else:
+            if known is not None and known['text'] is not None:
+                store_pdf_text(known['title'], known['text'])
+                release(pdf_url, True)
+                return
+            # Spooled to a temporary file and extracted from it, like extract_pdf_text
+            title = pdf_title(pdf_url)
+            loop = asyncio.get_running_loop()
+            pdf_fd, pdf_path = tempfile.mkstemp(suffix='.pdf')
+            os.close(pdf_fd)
+            try:
+                await _fetch_async(session, pdf_url, pdf_path, executor)
+                pdf_text = await loop.run_in_executor(executor, extract_text_from_pdf_file, pdf_path, EXTRACTION_POOL)
+            finally:
+                os.remove(pdf_path)
+            store_pdf_text(title, pdf_text)
+            if FRONTIER is not None:
+                FRONTIER.record_pdf(pdf_url, DONE, title=title, text=pdf_text)
+            print(f"Processed PDF: {title}")
+        release(pdf_url, True)
+
+    except Exception as e:
+        print(f"Error processing PDF from {pdf_url}: {e}")
+        release(pdf_url, False)
+        if FRONTIER is not None:
+            FRONTIER.record_pdf(pdf_url, FAILED)
+
+async def _crawl_document_async(session, document_url, mode, id2pdfurls, executor):
+    """
+    Crawl one document (and its children) and process its main page PDFs as soon as they are known.
+    Returns False if the document or one of its PDFs failed, True otherwise, duplicates included.
+    """
+    if not claim(document_url):
+        return True
+
+    all_pdf_dict = FRONTIER.get_document(document_url) if FRONTIER is not None else None
+    if all_pdf_dict is None:
+        all_pdf_dict = await _crawl_document_page_async(session, document_url)
+        if FRONTIER is not None and not stop_crawling:
+            FRONTIER.record_document(document_url, all_pdf_dict)
+            FRONTIER.add_pdfs(all_pdf_dict['mainpage'])
+    id2pdfurls[document_url] = (all_pdf_dict['mainpage'], all_pdf_dict['childrenpage'])
+    if 'error' in all_pdf_dict or stop_crawling:
+        release(document_url, False)
+        return False
+
+    # The handle stays claimed until its PDFs are processed, see checkpointed_crawl_document
+    try:
+        await asyncio.gather(
+            *(_process_pdf_async(session, pdf_url, mode, executor) for pdf_url in all_pdf_dict['mainpage'])
+        )
+    finally:
+        success = release_document(document_url, all_pdf_dict['mainpage'])
+    return success
+
+async def _crawl_listing_page_async(session, base_url, page_id, mode, id2pdfurls, executor, pages_in_flight):
+    """Crawl one discover page and all the documents it links to."""
+    async with pages_in_flight:
+        if stop_crawling or page_already_crawled(page_id):
+            return
+
+        current_url = base_url.format(page=page_id)
+        try:
+            content = await _fetch_async(session, current_url)
+            document_links = parse_listing_page(content)
+        except Exception as e:
+            print(f"Error crawling main page {current_url}: {e}")
+            checkpoint_page(page_id, FAILED)
+            return
+        if FRONTIER is not None:
+            FRONTIER.add_documents(document_links)
+
+        documents_ok = await asyncio.gather(
+            *(_crawl_document_async(session, document_url, mode, id2pdfurls, executor) for document_url in document_links)
+        )
+        # A page with a failed document or PDF stays failed, so that --resume retries them
+        checkpoint_page(page_id, DONE if all(documents_ok) else FAILED)
+        print(f"Finished crawling page {page_id}")
+
+async def _crawl_async(base_url, page_ids, mode, id2pdfurls, max_concurrency, per_host_concurrency):
+    global _document_tasks
+    _document_tasks = {}
+    # The connector enforces both the global and the per-host connection caps
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host_concurrency)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120)
+    # Bound the number of listing pages in flight so the frontier does not grow unchecked
+    pages_in_flight = asyncio.Semaphore(max_concurrency)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await asyncio.gather(
+                *(_crawl_listing_page_async(session, base_url, page_id, mode, id2pdfurls, executor, pages_in_flight)
+                  for page_id in page_ids)
+            )
+    return id2pdfurls
+
+def crawl_async(base_url, start_page, last_page, mode, id2pdfurls=None, max_concurrency=None, per_host_concurrency=None,
+                page_ids=None):
+    """
+    Crawl listing pages, document pages, child pages and PDFs through a single event loop, for
+    the pages start_page to last_page or, when given, the `page_ids` leased from a work queue.
+
+    File writes run on a MAX_WORKERS thread pool, text extraction on EXTRACTION_POOL when
+    set and on the thread pool otherwise. In 'read' mode the texts are kept by store_pdf_text;
+    in both modes the {document url: (main, children)} PDF URLs are returned like
+    crawl_main_page_for_downloading does.
+    """
+    id2pdfurls = {} if id2pdfurls is None else id2pdfurls
+    max_concurrency = max_concurrency or MAX_CONCURRENCY
+    per_host_concurrency = per_host_concurrency or PER_HOST_CONCURRENCY
+    page_ids = range(start_page, last_page + 1) if page_ids is None else page_ids
+    return asyncio.run(
+        _crawl_async(base_url, page_ids, mode, id2pdfurls, max_concurrency, per_host_concurrency)
+    )
+
+# -------------------------------- Work queue -------------------------------- #
+
+def crawl_from_queue(queue, crawl_pages, batch_size=1):
+    """
+    Crawl the pages leased from a work queue shared with other workers until none is left.
+
+    `crawl_pages(page_ids)` crawls a leased batch with the chosen engine, the async one pipelining
+    the whole batch through one event loop, and checkpoints the pages in the FRONTIER, which tells
+    whether each leased page is done or failed. Pages still leased when the crawl is stopped are
+    given back to the queue for the other workers.
+    """
+    queue.start_heartbeat()
+    try:
+        while not stop_crawling:
+            page_ids = queue.lease_pages(batch_size)
+            if not page_ids:
+                print(f"No page left in the work queue for {queue.worker_id}")
+                break
+            crawl_pages(page_ids)
+            for page_id in page_ids:
+                done = FRONTIER.page_done(page_id)
+                if not done and stop_crawling:
+                    break
+                if not queue.complete_page(page_id, DONE if done else FAILED):
+                    print(f"Lease of page {page_id} was lost to another worker")
+    finally:
+        queue.stop_heartbeat()
+        queue.return_pages()
+
 def listen_for_stop():
     """Listen for user input to stop crawling."""
     global stop_crawling
@@ -221,25 +949,32 @@ def remove_invalid_character(text):
     # safety method to remove surrogate characters that are invalid in UTF-8
     return re.sub(r'[\ud800-\udfff]', '', text)
 
-def save_to_hf_dataset(start_page, last_page):
-    """Save the global PDF_DATASET to a Hugging Face dataset."""
-    if not PDF_DATASET:
-        print("No PDF data to save.")
-        return
-    
-    data = {'title': [], 'text': []}
-    for title, pdf_text in PDF_DATASET.items():
+def save_to_hf_dataset(start_page, last_page, dataset_name=None):
+    """
+    Save the extracted texts to a Hugging Face dataset, streamed from the FRONTIER (or the
+    global PDF_DATASET without one) in bounded batches so memory does not grow with the corpus.
+    """
+    if FRONTIER is not None:
+        records = FRONTIER.iter_pdf_texts()
+    else:
+        records = ((title, pdf_text) for title, texts in PDF_DATASET.items() for pdf_text in texts)
+
+    # The SHA-1 of the text lets hf_dataset_merger deduplicate without reading the texts
+    writer = StreamingDatasetWriter(['title', 'text', 'text_sha1'])
+    for title, pdf_text in records:
         clean_title = remove_invalid_character(title)
         clean_text = remove_invalid_character(pdf_text)
+        writer.write({'title': clean_title, 'text': clean_text,
+                      'text_sha1': hashlib.sha1(clean_text.encode('utf-8')).hexdigest()})
 
-        data['title'].append(clean_title)
-        data['text'].append(clean_text)
-    
-    hf_dataset = Dataset.from_dict(data)
+    if not writer.num_records:
+        writer.cleanup()
+        print("No PDF data to save.")
+        return
     
     os.makedirs(PDF_STORAGE_PATH, exist_ok=True)
-    dataset_path = os.path.join(PDF_STORAGE_PATH, f"pdf_dataset_from_{start_page}_to_{last_page}")
-    hf_dataset.save_to_disk(dataset_path)
+    dataset_path = os.path.join(PDF_STORAGE_PATH, dataset_name or f"pdf_dataset_from_{start_page}_to_{last_page}")
+    writer.save_to_disk(dataset_path)
     print(f"Dataset saved to {dataset_path}")
 
 if __name__ == "__main__":
@@ -247,26 +982,112 @@ if __name__ == "__main__":
     parser.add_argument('start_page', type=int, help="The starting page number to crawl.")
     parser.add_argument('last_page', type=int, help="The last page number to crawl.")
     parser.add_argument('mode', choices=['download', 'read'], help="Mode of operation: 'download' to download PDFs, 'read' to only crawl and extract text.")
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads', help="'threads' crawls HTML pages serially, 'async' pipelines every fetch through one event loop.")
+    parser.add_argument('--extract-workers', type=int, default=os.cpu_count(), help="Read mode: number of processes extracting PDF text, 0 to extract on the download threads.")
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY, help="Async engine: maximum number of open connections.")
+    parser.add_argument('--per-host-concurrency', type=int, default=PER_HOST_CONCURRENCY, help="Async engine: maximum number of open connections per host.")
+    parser.add_argument('--harvest', choices=sorted(iris_harvest.HARVESTERS), default=None, help="Discover handles and PDFs from a bulk source instead of the listing and item pages: an OAI-PMH endpoint, the htmlmap zarr mirror or its Parquet handle index.")
+    parser.add_argument('--harvest-source', type=str, default=None, help="URL of the OAI-PMH endpoint, or path of the zarr mirror or handle index, given to --harvest.")
+    parser.add_argument('--html-backend', choices=sorted(html_extract.BACKENDS), default=html_extract.BACKEND, help="HTML link extractor of listing and document pages.")
+    parser.add_argument('--rate', type=float, default=None, help="Initial requests/second per host, adapted to the server's throttling.")
+    parser.add_argument('--max-rate', type=float, default=None, help="Maximum requests/second per host.")
+    parser.add_argument('--no-rate-limit', action='store_true', help="Send requests as fast as the workers allow.")
+    parser.add_argument('--cache-dir', type=str, default=None, help="Revalidate pages and PDFs against an on-disk HTTP cache kept in this folder.")
+    parser.add_argument('--cache-size', type=int, default=2048, help="Maximum size of the cached pages, in MB (downloaded PDFs are not counted, PDFs read for their text are not cached).")
+    parser.add_argument('--offline', action='store_true', help="Replay responses from --cache-dir without touching the network.")
+    parser.add_argument('--state-db', type=str, default=None, help="SQLite file checkpointing the crawl, defaults to one per mode and page range in JSON_STORAGE_PATH.")
+    parser.add_argument('--resume', action='store_true', help="Resume the crawl checkpointed in --state-db, skipping completed pages, documents and PDFs.")
+    parser.add_argument('--queue', type=str, default=None, help="SQLite work queue shared by several workers, on a shared filesystem for several nodes: the pages are seeded into it and leased from it.")
+    parser.add_argument('--worker-id', type=str, default=None, help="Name of this worker in the work queue, defaults to host-pid. Reusing it resumes the worker's own state.")
+    parser.add_argument('--lease-seconds', type=int, default=600, help="Lease of a page or PDF in the work queue, renewed while the worker is alive and handed to another worker once it expires.")
+    parser.add_argument('--lease-batch', type=int, default=1, help="Number of pages leased at once from the work queue.")
+    parser.add_argument('--dedup-index', type=str, default=None, help="File persisting the handles and PDFs already processed, shared between runs.")
+    parser.add_argument('--bloom-capacity', type=int, default=None, help="Back a new deduplication index with a Bloom filter sized for this many URLs instead of an exact set.")
 
     args = parser.parse_args()
+    if args.offline and not args.cache_dir:
+        parser.error("--offline requires --cache-dir")
+    if args.harvest and not args.harvest_source:
+        parser.error("--harvest requires --harvest-source")
+    if args.harvest and args.queue:
+        parser.error("--harvest reads its records in one pass and cannot lease pages from --queue")
+
+    html_extract.set_backend(args.html_backend)
+    transport.configure(rate=args.rate, max_rate=args.max_rate, rate_limit=not args.no_rate_limit)
+    if args.cache_dir:
+        transport.configure(cache=HTTPCache(args.cache_dir, max_bytes=args.cache_size << 20, offline=args.offline))
+
+    queue = None
+    if args.queue:
+        # Workers of a shared queue name their outputs after themselves, whatever pages they get
+        queue = WorkQueue(args.queue, worker_id=args.worker_id, lease_seconds=args.lease_seconds)
+        queue.add_pages(range(args.start_page, args.last_page + 1))
+        run_name = f"worker_{queue.worker_id}"
+        print(f"Worker {queue.worker_id} leasing pages from the work queue {args.queue}")
+    else:
+        run_name = f"{args.start_page}_to_{args.last_page}"
+
+    state_db = args.state_db or os.path.join(JSON_STORAGE_PATH, f"crawl_state_{args.mode}_{run_name}.sqlite")
+    FRONTIER = CrawlFrontier(state_db, resume=args.resume or bool(args.queue))
+    if queue is None:
+        FRONTIER.add_pages(range(args.start_page, args.last_page + 1))
+    print(f"{'Resuming' if args.resume else 'Checkpointing'} crawl state in {state_db}")
+    # The queue deduplicates handles and PDFs across all its workers
+    DEDUP = queue or DedupIndex(args.dedup_index, bloom_capacity=args.bloom_capacity)
 
     # Base URL
     BASE_URL = "https://iris.who.int/discover?rpp=10&etal=0&query=Guidelines&scope=/&group_by=none&page={page}"
 
-    print(f"Crawling from page {args.start_page} to {args.last_page} in '{args.mode}' mode.")
+    if args.harvest:
+        print(f"Harvesting records of pages {args.start_page} to {args.last_page} from {args.harvest_source} in '{args.mode}' mode.")
+    else:
+        print(f"Crawling from page {args.start_page} to {args.last_page} in '{args.mode}' mode with the '{args.engine}' engine.")
 
     start_time = time.time()
 
-    # Decide based on the mode
-    if args.mode == 'download':
+    if args.mode == 'read' and args.extract_workers:
+        EXTRACTION_POOL = create_extraction_pool(args.extract_workers)
+
+    # Decide based on the discovery, the engine and the mode
+    if args.harvest:
+        records = iris_harvest.HARVESTERS[args.harvest](args.harvest_source)
+        id2pdfurls = crawl_harvested(records, args.mode, {}, args.start_page, args.last_page)
+    elif queue is not None:
+        id2pdfurls = {}
+        if args.engine == 'async':
+            crawl_pages = lambda page_ids: crawl_async(BASE_URL, None, None, args.mode, id2pdfurls, page_ids=page_ids,
+                                                       max_concurrency=args.max_concurrency, per_host_concurrency=args.per_host_concurrency)
+        elif args.mode == 'download':
+            crawl_pages = lambda page_ids: [crawl_main_page_for_downloading(BASE_URL, id2pdfurls, p, p) for p in page_ids]
+        else:
+            crawl_pages = lambda page_ids: [crawl_main_page(BASE_URL, p, p) for p in page_ids]
+        crawl_from_queue(queue, crawl_pages, args.lease_batch)
+    elif args.engine == 'async':
+        id2pdfurls = crawl_async(BASE_URL, args.start_page, args.last_page, args.mode,
+                                 max_concurrency=args.max_concurrency, per_host_concurrency=args.per_host_concurrency)
+    elif args.mode == 'download':
         id2pdfurls = {}
         id2pdfurls = crawl_main_page_for_downloading(BASE_URL, id2pdfurls, args.start_page, args.last_page)
-        with open(f'{JSON_STORAGE_PATH}/id2pdfurls{args.start_page}_to_{args.last_page}.json', 'w') as json_file:
-            json.dump(id2pdfurls, json_file, indent=4)
-        print("SAVE AS JSON")
     elif args.mode == 'read':
         crawl_main_page(BASE_URL, args.start_page, args.last_page)
-        save_to_hf_dataset(args.start_page, args.last_page)
 
+    # Save everything checkpointed, including the work done by earlier runs of a resumed crawl
+    if args.mode == 'download':
+        id2pdfurls = FRONTIER.id2pdfurls()
+        with open(f'{JSON_STORAGE_PATH}/id2pdfurls{"_" + run_name if queue else run_name}.json', 'w') as json_file:
+            json.dump(id2pdfurls, json_file, indent=4)
+        print("SAVE AS JSON")
+    else:
+        save_to_hf_dataset(args.start_page, args.last_page, f"pdf_dataset_{run_name}" if queue else None)
+
+    if EXTRACTION_POOL is not None:
+        EXTRACTION_POOL.shutdown()
+    FRONTIER.print_summary()
+    DEDUP.save()
+    DEDUP.print_summary()
     elapsed_time = time.time() - start_time
+    transport.STATS.print_summary()
+    transport.LIMITER.print_summary()
+    if transport.CACHE is not None:
+        transport.CACHE.print_summary()
     print(f"Time taken to crawl from page {args.start_page} to {args.last_page}: {elapsed_time:.2f} seconds")
@@ -0,0 +1,160 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import PyPDF2
+
+import iris_crawler
+import iris_harvest
+
+DOCS_PER_PAGE = 10
+CHILD_OFFSET = 100000  # Child language handles live in their own id range
+OAI_PAGE_SIZE = 100
+
+def _blank_pdf():
+    """Build a small valid one-page PDF to serve as every bitstream."""
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=595, height=842)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+class MockIrisServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default backlog of 5 drops connection bursts from the async engine
+
+class MockIrisHandler(BaseHTTPRequestHandler):
+    """Serve discover listings, item pages and bitstreams shaped like iris.who.int, with a fixed latency."""
+    latency = 0.05
+    pdf_bytes = b''
+    oai_records = 0  # Top-level items listed by the OAI-PMH feed, from the first discover page on
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type):
+        time.sleep(self.latency)
+        etag = f'"{hash(body) & 0xffffffff:08x}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        base = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+
+        if url.path == '/discover':
+            page = int(parse_qs(url.query)['page'][0])
+            links = ''.join(
+                f'<li><a href="/handle/10665/{page * DOCS_PER_PAGE + i}">Guideline {i}</a></li>'
+                for i in range(DOCS_PER_PAGE)
+            )
+            self._send(f'<html><body><ul>{links}</ul></body></html>'.encode(), 'text/html')
+
+        elif url.path.startswith('/handle/10665/'):
+            handle = int(url.path.split('/')[-1])
+            links = f'<a href="/bitstream/handle/10665/{handle}/{handle}_eng.pdf?sequence=1">PDF</a>'
+            if handle < CHILD_OFFSET:
+                # Every top-level item has one child language version
+                links += f'<a href="{base}/handle/10665/{handle + CHILD_OFFSET}">Français</a>'
+            self._send(
+                f'<html><body><div id="aspect_artifactbrowser_ItemViewer_div_item-view">{links}</div></body></html>'.encode(),
+                'text/html'
+            )
+
+        elif url.path == '/oai/request':
+            query = parse_qs(url.query)
+            offset = int(query.get('resumptionToken', ['0'])[0])
+            records = ''.join(
+                f'<record><header><identifier>oai:iris.who.int:10665/{handle}</identifier></header><metadata><oai_dc:dc>'
+                f'<dc:identifier>{base}/handle/10665/{handle}</dc:identifier><dc:language>en</dc:language>'
+                f'<dc:relation>{base}/bitstream/handle/10665/{handle}/{handle}_eng.pdf?sequence=1</dc:relation>'
+                f'</oai_dc:dc></metadata></record>'
+                for handle in range(DOCS_PER_PAGE + offset, DOCS_PER_PAGE + min(offset + OAI_PAGE_SIZE, self.oai_records))
+            )
+            token = offset + OAI_PAGE_SIZE
+            resumption = f'<resumptionToken>{token}</resumptionToken>' if token < self.oai_records else '<resumptionToken/>'
+            self._send(
+                ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/" xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/" '
+                 f'xmlns:dc="http://purl.org/dc/elements/1.1/"><ListRecords>{records}{resumption}</ListRecords></OAI-PMH>').encode(),
+                'text/xml'
+            )
+
+        elif url.path.startswith('/bitstream/'):
+            self._send(self.pdf_bytes, 'application/pdf')
+
+        else:
+            self.send_error(404)
+
+def start_mock_server(latency):
+    MockIrisHandler.latency = latency
+    MockIrisHandler.pdf_bytes = _blank_pdf()
+    server = MockIrisServer(('127.0.0.1', 0), MockIrisHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_engine(engine, base_url, pages, mode):
+    """Crawl `pages` listing pages with the given engine and return the elapsed time and number of documents."""
+    # Each engine starts from a clean crawl
+    iris_crawler.PDF_DATASET.clear()
+    iris_crawler.DOCUMENT_PAGES.clear()
+    iris_crawler.DEDUP = iris_crawler.DedupIndex()
+    with tempfile.TemporaryDirectory() as storage, contextlib.redirect_stdout(io.StringIO()):
+        iris_crawler.PDF_STORAGE_PATH = storage
+        start_time = time.time()
+        if engine == 'harvest':
+            iris_crawler.JSON_STORAGE_PATH = os.path.join(storage, 'json')
+            records = iris_harvest.harvest_oai(iris_crawler.IRIS_BASE_URL + '/oai/request')
+            id2pdfurls = iris_crawler.crawl_harvested(records, mode, {}, 1, pages)
+        elif engine == 'async':
+            id2pdfurls = iris_crawler.crawl_async(base_url, 1, pages, mode)
+        elif mode == 'download':
+            id2pdfurls = iris_crawler.crawl_main_page_for_downloading(base_url, {}, 1, pages)
+        else:
+            iris_crawler.crawl_main_page(base_url, 1, pages)
+            id2pdfurls = None
+        elapsed_time = time.time() - start_time
+        nbr_pdfs = len([n for n in os.listdir(storage) if n != 'json']) if mode == 'download' else len(iris_crawler.PDF_DATASET)
+    return elapsed_time, nbr_pdfs, id2pdfurls
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the threads and async IRIS crawl engines against a local mock IRIS server.")
+    parser.add_argument('--pages', type=int, default=5, help="Number of discover pages to crawl.")
+    parser.add_argument('--latency', type=float, default=0.05, help="Artificial server latency per request, in seconds.")
+    parser.add_argument('--mode', choices=['download', 'read'], default='download')
+    args = parser.parse_args()
+
+    server = start_mock_server(args.latency)
+    MockIrisHandler.oai_records = args.pages * DOCS_PER_PAGE
+    iris_crawler.IRIS_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    base_url = iris_crawler.IRIS_BASE_URL + "/discover?rpp=10&etal=0&query=Guidelines&scope=/&group_by=none&page={page}"
+
+    print(f"Mock IRIS server at {iris_crawler.IRIS_BASE_URL}, {args.pages} pages, {args.latency * 1000:.0f} ms latency, '{args.mode}' mode")
+
+    results = {}
+    for engine in ['threads', 'async', 'harvest']:
+        elapsed_time, nbr_pdfs, id2pdfurls = run_engine(engine, base_url, args.pages, args.mode)
+        results[engine] = (elapsed_time, id2pdfurls)
+        print(f"{engine:>8}: {elapsed_time:7.2f} seconds, {nbr_pdfs} PDFs")
+
+    if args.mode == 'download':
+        assert results['threads'][1] == results['async'][1], "Engines discovered different PDF URLs"
+    print(f"Speedup: {results['threads'][0] / results['async'][0]:.1f}x async, "
+          f"{results['threads'][0] / results['harvest'][0]:.1f}x OAI-PMH harvest")
+    if args.mode == 'download':
+        assert {url: main for url, (main, _) in results['threads'][1].items()} == \
+               {url: main for url, (main, _) in results['harvest'][1].items()}, "Harvest found different PDF URLs"
+    server.shutdown()
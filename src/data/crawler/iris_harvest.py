@@ -0,0 +1,107 @@
+import csv
+import io
+import re
+import xml.etree.ElementTree as ET
+from urllib.parse import unquote, urlencode
+
+import pyarrow.parquet as pq
+import zarr
+
+import transport
+
+HANDLE_PATTERN = re.compile(r'/handle/(\d+/\d+)|^oai:[^:]+:(\d+/\d+)$')
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+# --------------------------------- OAI-PMH ---------------------------------- #
+
+def _parse_oai_record(record):
+    """Return (handle, languages, file links) of an OAI-PMH record, None for a deleted one or one without handle."""
+    header = next((e for e in record if _local_name(e.tag) == 'header'), None)
+    if header is not None and header.get('status') == 'deleted':
+        return None
+
+    handle, languages, file_links = None, [], []
+    for element in record.iter():
+        values = [element.text.strip()] if element.text and element.text.strip() else []
+        values += list(element.attrib.values())
+        if _local_name(element.tag) == 'language':
+            languages.extend(values[:1])
+        for value in values:
+            if '/bitstream/' in value:
+                file_links.append(value)
+            elif handle is None and (match := HANDLE_PATTERN.search(value)):
+                handle = match.group(1) or match.group(2)
+    return (handle, languages, list(dict.fromkeys(file_links))) if handle else None
+
+def harvest_oai(base_url, metadata_prefix='oai_dc', set_spec=None):
+    """
+    Yield (handle, languages, file links) for every record of an OAI-PMH ListRecords feed, handles as '10665/1234'.
+
+    Each response page is parsed incrementally and its records dropped once yielded, and the
+    resumption tokens are followed until the feed is exhausted. Bitstream links are taken from
+    any element or attribute pointing to /bitstream/, so formats listing them (ore, mets, or a
+    dc.file-link field) all work.
+    """
+    params = {'verb': 'ListRecords', 'metadataPrefix': metadata_prefix}
+    if set_spec:
+        params['set'] = set_spec
+
+    while params:
+        # The query goes in the URL so that the response cache keys every page apart
+        response = transport.get(f"{base_url}?{urlencode(params)}")
+        response.raise_for_status()
+
+        params = None
+        for _, element in ET.iterparse(io.BytesIO(response.content), events=('end',)):
+            name = _local_name(element.tag)
+            if name == 'record':
+                record = _parse_oai_record(element)
+                element.clear()
+                if record is not None:
+                    yield record
+            elif name == 'resumptionToken' and element.text and element.text.strip():
+                params = {'verb': 'ListRecords', 'resumptionToken': element.text.strip()}
+            elif name == 'error' and element.get('code') != 'noRecordsMatch':
+                raise ValueError(f"OAI-PMH error {element.get('code')}: {element.text}")
+
+# ------------------------------- htmlmap mirror ------------------------------ #
+
+def parse_metadata_csv(content):
+    """Return {key: [values]} of a link group's key,value metadata CSV (header row first)."""
+    metadata = {}
+    rows = csv.reader(io.StringIO(content.decode('utf-8', errors='replace')))
+    next(rows, None)
+    for row in rows:
+        if len(row) >= 2:
+            metadata.setdefault(row[0], []).append(row[1])
+    return metadata
+
+def link_group_handle(name):
+    """Handle of a link group, named after the quoted URL of its item page."""
+    match = HANDLE_PATTERN.search(unquote(name))
+    return match.group(1) if match else None
+
+def harvest_zarr(store_path):
+    """
+    Yield (handle, languages, file links) of every item of the htmlmap zarr mirror.
+
+    The mirror has one group per htmlmap page, holding one group per linked item page, whose
+    'metadata' array is the item's metadata as a key,value CSV.
+    """
+    root = zarr.open_group(store_path, mode='r')
+    for _, submap_group in root.groups():
+        for name, link_group in submap_group.groups():
+            handle = link_group_handle(name)
+            if handle is None or 'metadata' not in link_group:
+                continue
+            metadata = parse_metadata_csv(link_group['metadata'][:].tobytes())
+            yield handle, metadata.get('dc.language.iso', []), metadata.get('dc.file-link', [])
+
+def harvest_index(index_path):
+    """Yield (handle, languages, file links) of every item of a Parquet handle index built by metadata_reader."""
+    for batch in pq.ParquetFile(index_path).iter_batches(columns=['id', 'language', 'file_link']):
+        yield from zip(*(batch.column(name).to_pylist() for name in ('id', 'language', 'file_link')))
+
+HARVESTERS = {'oai': harvest_oai, 'zarr': harvest_zarr, 'index': harvest_index}
@@ -0,0 +1,85 @@
+import argparse
+import os
+import tempfile
+import time
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+import PyPDF2
+
+import iris_crawler
+
+LOREM = ("Recommendation: health workers should offer counselling on infant and young child feeding "
+         "to all mothers, and monitor growth at every contact with the health system. ")
+
+def build_fixture_corpus(nbr_docs, nbr_pages):
+    """Generate `nbr_docs` text PDFs of `nbr_pages` pages each, in memory."""
+    corpus = []
+    for d in range(nbr_docs):
+        doc = fitz.open()
+        for p in range(nbr_pages):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), f"Document {d}, page {p}. " + LOREM * 12, fontsize=10)
+        corpus.append(doc.tobytes())
+        doc.close()
+    return corpus
+
+def load_corpus(corpus_dir):
+    corpus = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith('.pdf'):
+            with open(os.path.join(corpus_dir, name), 'rb') as f:
+                corpus.append(f.read())
+    return corpus
+
+def legacy_extract_text(content):
+    """The read mode extraction before the process pool: every page extracted twice, quadratic concatenation."""
+    reader = PyPDF2.PdfReader(BytesIO(content))
+    pdf_text = ''
+    for page in reader.pages:
+        pdf_text += page.extract_text() if page.extract_text() else ''
+    return pdf_text
+
+def write_corpus(corpus, corpus_dir):
+    """Write the corpus to files, which read mode extracts from once spooled to disk."""
+    paths = []
+    for i, content in enumerate(corpus):
+        paths.append(os.path.join(corpus_dir, f"{i:05d}.pdf"))
+        with open(paths[-1], 'wb') as f:
+            f.write(content)
+    return paths
+
+def count_pages(corpus):
+    return sum(len(PyPDF2.PdfReader(BytesIO(content)).pages) for content in corpus)
+
+def run(executor, extract, corpus):
+    start_time = time.time()
+    texts = list(executor.map(extract, corpus))
+    return time.time() - start_time, texts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare read mode PDF text extraction on threads (before) and on a process pool (after).")
+    parser.add_argument('--corpus', type=str, default=None, help="Folder of PDFs to use instead of the generated fixture corpus.")
+    parser.add_argument('--docs', type=int, default=32, help="Number of generated fixture documents.")
+    parser.add_argument('--pages', type=int, default=20, help="Number of pages per generated fixture document.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of extraction processes.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else build_fixture_corpus(args.docs, args.pages)
+    nbr_pages = count_pages(corpus)
+    print(f"Corpus: {len(corpus)} PDFs, {nbr_pages} pages, {args.workers} extraction processes")
+
+    with ThreadPoolExecutor(max_workers=iris_crawler.MAX_WORKERS) as executor:
+        before_time, before_texts = run(executor, legacy_extract_text, corpus)
+    print(f"  before (threads, legacy extraction): {nbr_pages / before_time:8.1f} pages/second")
+
+    with tempfile.TemporaryDirectory() as corpus_dir, iris_crawler.create_extraction_pool(args.workers) as executor:
+        pdf_paths = write_corpus(corpus, corpus_dir)
+        # Spawn every worker outside of the timing: workers start on demand, so keep them all busy at once
+        list(executor.map(time.sleep, [0.5] * args.workers))
+        after_time, after_texts = run(executor, iris_crawler.extract_text_from_pdf_file, pdf_paths)
+    print(f"  after (process pool, file path):     {nbr_pages / after_time:8.1f} pages/second")
+
+    assert before_texts == after_texts, "Both extractions must produce the same text"
+    print(f"Speedup: {before_time / after_time:.1f}x")
@@ -1,5 +1,41 @@
 import fitz  # PyMuPDF
 
+def page_blocks(page, margin_top=40, margin_bottom=40):
+    """
+    Yield the text blocks of a page, excluding footnotes and page numbers based on their
+    position on the page.
+
+    :param page: The PyMuPDF page object.
+    :param margin_top: Margin from the top of the page to exclude content (e.g., page numbers).
+    :param margin_bottom: Margin from the bottom of the page to exclude content (e.g., footnotes).
+    """
+    page_rect = page.rect
+    content_rect = fitz.Rect(
+        page_rect.x0, margin_top, page_rect.x1, page_rect.y1 - margin_bottom
+    )
+
+    for block in page.get_text("blocks"):
+        if content_rect.contains(fitz.Rect(block[:4])):
+            yield block[4]
+
+def iter_page_texts(pdf_path, margin_top=40, margin_bottom=40):
+    """
+    Yield (page number, text) for every page of a PDF file, its blocks joined by spaces after
+    the margin filtering of `page_blocks`.
+
+    The document is opened from its file, which MuPDF reads on demand rather than loading,
+    and each page is released before the next one is parsed, so memory is bounded by one
+    page whatever the length of the document.
+
+    :param pdf_path: Path to the PDF file.
+    """
+    with fitz.open(pdf_path) as doc:
+        for page_no in range(doc.page_count):
+            page = doc.load_page(page_no)
+            text = " ".join(page_blocks(page, margin_top, margin_bottom))
+            del page
+            yield page_no, text
+
 def extract_text(doc, out, margin_top=40, margin_bottom=40):
     """
     Extracts text from the document while excluding footnotes and page numbers
@@ -11,17 +47,8 @@ def extract_text(doc, out, margin_top=40, margin_bottom=40):
     :param margin_bottom: Margin from the bottom of the page to exclude content (e.g., footnotes).
     """
     for page in doc:  
-        page_rect = page.rect
-        content_rect = fitz.Rect(
-            page_rect.x0, margin_top, page_rect.x1, page_rect.y1 - margin_bottom
-        )
-
-        blocks = page.get_text("blocks")
-        for block in blocks:
-            block_rect = fitz.Rect(block[:4])
-            if content_rect.contains(block_rect):
-                text = block[4].encode("utf8")
-                out.write(text)  
+        for text in page_blocks(page, margin_top, margin_bottom):
+            out.write(text.encode("utf8"))  
         out.write("\f".encode("utf8"))  # page delimiter
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+THROTTLE_STATUSES = {429, 503}
+
+class HostRateLimiter:
+    """
+    Token bucket pacing the requests to one host, its rate adapted AIMD-style.
+
+    Every success raises the rate: by one request/second per request until the host first
+    throttles (slow start), then by `additive_increase / rate`, about `additive_increase`
+    requests/second per second. A 429 or 503 halves it, at most once per `cooldown` seconds
+    so a burst of throttled requests counts once, and honours Retry-After by pausing the
+    host. While the mean latency is over `latency_factor` times the lowest seen, the rate
+    is held instead of raised.
+    """
+
+    def __init__(self, rate=10.0, min_rate=0.5, max_rate=200.0, burst=None,
+                 additive_increase=1.0, decrease_factor=0.5, cooldown=1.0, latency_factor=3.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.latency_factor = latency_factor
+
+        self.throttle_events = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._tokens = self._capacity()
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency_mean = None
+        self._latency_min = None
+
+    def _capacity(self):
+        return self.burst if self.burst else max(1.0, self.rate)
+
+    def reserve(self):
+        """Take a token and return how long to wait, in seconds, before sending the request."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity(), self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1
+            self.requests += 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(delay, self._paused_until - now)
+
+    def record(self, status, latency=None, retry_after=None):
+        """Adapt the rate to a response: `status` None for a connection error, which leaves it as is."""
+        with self._lock:
+            now = time.monotonic()
+            if status in THROTTLE_STATUSES:
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self.throttle_events += 1
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                    self._tokens = min(self._tokens, 0.0)
+                return
+
+            if status is None or status >= 500:
+                return
+            if latency is not None:
+                self._latency_min = latency if self._latency_min is None else min(self._latency_min, latency)
+                self._latency_mean = latency if self._latency_mean is None else 0.9 * self._latency_mean + 0.1 * latency
+                if self._latency_mean > self.latency_factor * max(self._latency_min, 1e-3):
+                    return
+
+            increase = 1.0 if not self.throttle_events else self.additive_increase / self.rate
+            self.rate = min(self.max_rate, self.rate + increase)
+
+class RateLimiter:
+    """Per-host registry of HostRateLimiter, shared by every request of a crawler, threads and event loop alike."""
+
+    def __init__(self, **host_settings):
+        self.host_settings = host_settings
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.hosts = {}
+
+    def configure(self, enabled=None, **host_settings):
+        """Override the settings of the hosts limited from now on."""
+        if enabled is not None:
+            self.enabled = enabled
+        self.host_settings.update({key: value for key, value in host_settings.items() if value is not None})
+
+    def host(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostRateLimiter(**self.host_settings)
+            return self.hosts[host]
+
+    def acquire(self, url):
+        if self.enabled:
+            delay = self.host(url).reserve()
+            if delay > 0:
+                time.sleep(delay)
+
+    async def acquire_async(self, url):
+        if self.enabled:
+            delay = self.host(url).reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def record(self, url, status, latency=None, retry_after=None):
+        if self.enabled:
+            self.host(url).record(status, latency, retry_after)
+
+    def summary(self):
+        with self._lock:
+            return {
+                host: {'rate': limiter.rate, 'throttle_events': limiter.throttle_events, 'requests': limiter.requests}
+                for host, limiter in self.hosts.items()
+            }
+
+    def print_summary(self):
+        for host, counters in self.summary().items():
+            print(f"{host}: rate {counters['rate']:.1f} requests/second, {counters['throttle_events']} throttle events "
+                  f"over {counters['requests']} requests")
@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import CacheMiss
+from rate_limiter import RateLimiter
+
+# Transport settings shared by every crawler
+POOL_SIZE = 16  # Keep-alive connections kept per host, match the crawler's MAX_WORKERS
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # Seconds, doubled at every retry
+BACKOFF_MAX = 60.0
+DEFAULT_TIMEOUT = (30, 120)  # (connect, read) in seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CACHE = None  # Optional http_cache.HTTPCache revalidating every plain GET
+LIMITER = RateLimiter()  # Paces every request per host, adapting to throttling
+
+_local = threading.local()
+
+class TransportStats:
+    """Thread-safe per-host request, retry and latency counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hosts = {}
+
+    def _host(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = {'requests': 0, 'retries': 0, 'failures': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+        return self.hosts[host]
+
+    def record_request(self, url, latency):
+        with self._lock:
+            counters = self._host(url)
+            counters['requests'] += 1
+            counters['latency_total'] += latency
+            counters['latency_max'] = max(counters['latency_max'], latency)
+
+    def record_retry(self, url):
+        with self._lock:
+            self._host(url)['retries'] += 1
+
+    def record_failure(self, url):
+        with self._lock:
+            self._host(url)['failures'] += 1
+
+    def summary(self):
+        with self._lock:
+            return {
+                host: {**counters, 'latency_mean': counters['latency_total'] / counters['requests'] if counters['requests'] else 0.0}
+                for host, counters in self.hosts.items()
+            }
+
+    def print_summary(self):
+        for host, counters in self.summary().items():
+            print(f"{host}: {counters['requests']} requests, {counters['retries']} retries, {counters['failures']} failures, "
+                  f"latency mean {counters['latency_mean']:.3f}s / max {counters['latency_max']:.3f}s")
+
+STATS = TransportStats()
+
+def configure(pool_size=None, max_retries=None, cache=None, rate=None, max_rate=None, rate_limit=None):
+    """
+    Override the pool size, retry budget or response cache, sessions created afterwards pick them up,
+    and the initial and maximum request rate per host of LIMITER, or disable it with `rate_limit=False`.
+    """
+    global POOL_SIZE, MAX_RETRIES, CACHE
+    if pool_size is not None:
+        POOL_SIZE = pool_size
+    if max_retries is not None:
+        MAX_RETRIES = max_retries
+    if cache is not None:
+        CACHE = cache
+    LIMITER.configure(enabled=rate_limit, rate=rate, max_rate=max_rate)
+
+def get_session():
+    """Return the calling worker's keep-alive session, creating it on first use."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+    return session
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) to seconds, None if absent or invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """Jittered exponential backoff, the server's Retry-After wins when it asks for longer."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_MAX) + random.uniform(0, BACKOFF_BASE))
+    return delay
+
+def request(method, url, **kwargs):
+    """
+    Send a request on the worker's pooled session, retrying connection errors and RETRY_STATUSES.
+
+    The last response is returned once the retry budget is spent so callers keep using
+    raise_for_status(); the last connection error is raised if no response was ever received.
+    """
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+
+    for attempt in range(MAX_RETRIES + 1):
+        response, error = None, None
+        LIMITER.acquire(url)
+        start_time = time.perf_counter()
+        try:
+            response = get_session().request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        latency = time.perf_counter() - start_time
+        STATS.record_request(url, latency)
+
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        LIMITER.record(url, response.status_code if response is not None else None, latency, retry_after)
+
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            return response
+        if attempt == MAX_RETRIES:
+            break
+
+        if response is not None:
+            response.close()
+        STATS.record_retry(url)
+        time.sleep(backoff_delay(attempt, retry_after))
+
+    STATS.record_failure(url)
+    if response is None:
+        raise error
+    return response
+
+def get(url, **kwargs):
+    """GET through the response cache when one is configured, streamed and ranged requests bypass it."""
+    headers = kwargs.get('headers') or {}
+    if CACHE is None or kwargs.get('stream') or 'Range' in headers:
+        return request('GET', url, **kwargs)
+
+    entry = CACHE.lookup(url)
+    if CACHE.offline:
+        if entry is None:
+            raise CacheMiss(f"{url} is not in the offline cache")
+        CACHE.record_hit()
+        return CACHE.to_response(entry)
+
+    kwargs['headers'] = {**headers, **CACHE.conditional_headers(entry)}
+    response = request('GET', url, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        CACHE.record_hit()
+        return CACHE.to_response(entry)
+    if response.status_code == 200:
+        CACHE.record_miss()
+        CACHE.store(url, response.headers, response.content)
+    return response
+
+def get_to_file(url, path, chunk_size=1 << 20, **kwargs):
+    """
+    GET a body into the file at `path`, `chunk_size` at a time, so memory stays at one chunk.
+
+    The response cache is bypassed, as for any streamed request: the bodies fetched this way
+    are PDFs read for their text, which would count against the cache size and evict the
+    pages, and whose text the frontier already keeps. Offline, they are cache misses.
+    """
+    if CACHE is not None and CACHE.offline:
+        raise CacheMiss(f"{url} is not in the offline cache")
+    with request('GET', url, stream=True, **kwargs) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
@@ -0,0 +1,238 @@
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from crawl_state import PENDING, DONE, FAILED
+from dedup import canonicalize_url
+
+LEASED = 'leased'
+
+class WorkQueue:
+    """
+    Work queue shared by every crawler of a multi-process or multi-node crawl, in one SQLite file.
+
+    Workers lease listing pages for `lease_seconds` and renew their leases from a heartbeat
+    thread while they work. The lease of a dead worker expires and its pages are handed to the
+    next worker asking for work, so workers can be added or lost at any time. Handles and PDFs
+    are leased the same way through `claim` and `release`, the DedupIndex interface, so a
+    document listed on several pages or a PDF shared by several documents is processed by one
+    worker only. Every lease is taken in an immediate transaction, and the database uses a
+    rollback journal rather than WAL, which needs shared memory that network filesystems lack.
+    """
+
+    def __init__(self, db_path, worker_id=None, lease_seconds=600, max_attempts=3):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.skipped = 0
+
+        self._lock = threading.Lock()
+        self._in_flight = set()  # Claimed by this process and not released yet
+        self._heartbeat = None
+        self._stop_heartbeat = threading.Event()
+        # Transactions are managed explicitly, busy workers are waited for instead of failing
+        self._db = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=DELETE')
+        with self._transaction():
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                'page_id INTEGER PRIMARY KEY, status TEXT, worker TEXT, lease_expires REAL, attempts INTEGER)'
+            )
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS items (url TEXT PRIMARY KEY, status TEXT, worker TEXT, lease_expires REAL)'
+            )
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._db, self._lock)
+
+    # ---------------------------------- Pages ----------------------------------- #
+
+    def add_pages(self, page_ids):
+        """Queue pages not queued yet, so that every worker can seed the queue or extend its range."""
+        with self._transaction():
+            self._db.executemany(
+                'INSERT OR IGNORE INTO pages VALUES (?, ?, NULL, NULL, 0)', [(p, PENDING) for p in page_ids]
+            )
+
+    def lease_pages(self, count=1):
+        """Lease up to `count` pending or expired pages to this worker, lowest first; an empty list when none is left."""
+        now = time.time()
+        with self._transaction():
+            rows = self._db.execute(
+                'SELECT page_id FROM pages WHERE (status = ? OR (status = ? AND lease_expires < ?)) AND attempts < ? '
+                'ORDER BY page_id LIMIT ?',
+                (PENDING, LEASED, now, self.max_attempts, count)
+            ).fetchall()
+            page_ids = [row[0] for row in rows]
+            self._db.executemany(
+                'UPDATE pages SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE page_id = ?',
+                [(LEASED, self.worker_id, now + self.lease_seconds, page_id) for page_id in page_ids]
+            )
+        return page_ids
+
+    def complete_page(self, page_id, status):
+        """
+        Mark a leased page done, or failed, in which case it is queued again until it has been
+        tried `max_attempts` times. Returns False if the lease was lost to another worker.
+        """
+        with self._transaction():
+            updated = self._db.execute(
+                'UPDATE pages SET status = CASE WHEN ? = ? THEN ? WHEN attempts < ? THEN ? ELSE ? END, lease_expires = NULL '
+                'WHERE page_id = ? AND worker = ? AND status = ?',
+                (status, DONE, DONE, self.max_attempts, PENDING, FAILED, page_id, self.worker_id, LEASED)
+            ).rowcount
+        return updated == 1
+
+    def return_pages(self):
+        """Give back the pages this worker still leases, without counting the attempt, when it stops early."""
+        with self._transaction():
+            return self._db.execute(
+                'UPDATE pages SET status = ?, lease_expires = NULL, attempts = attempts - 1 WHERE worker = ? AND status = ?',
+                (PENDING, self.worker_id, LEASED)
+            ).rowcount
+
+    def reset_failed(self):
+        """Queue the pages that failed, or whose worker died, `max_attempts` times again, with fresh attempts."""
+        with self._transaction():
+            return self._db.execute(
+                'UPDATE pages SET status = ?, attempts = 0 WHERE status = ? OR (status = ? AND lease_expires < ? AND attempts >= ?)',
+                (PENDING, FAILED, LEASED, time.time(), self.max_attempts)
+            ).rowcount
+
+    # --------------------------- Handles and PDFs ------------------------------ #
+
+    def claim(self, url):
+        """
+        Return True if this worker should process `url`, False if it is done, leased by a live
+        worker or already claimed by this one. A lease of this worker id that no thread of this
+        process holds was left by a previous run and is taken over.
+        """
+        key = canonicalize_url(url)
+        now = time.time()
+        with self._transaction():
+            row = self._db.execute('SELECT status, worker, lease_expires FROM items WHERE url = ?', (key,)).fetchone()
+            if key in self._in_flight or (row is not None and (row[0] == DONE or (row[1] != self.worker_id and row[2] >= now))):
+                self.skipped += 1
+                return False
+            self._db.execute(
+                'INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)', (key, LEASED, self.worker_id, now + self.lease_seconds)
+            )
+            self._in_flight.add(key)
+            return True
+
+    def release(self, url, success=True):
+        """Mark a claimed URL done, or give it up so that any worker can retry it."""
+        key = canonicalize_url(url)
+        with self._transaction():
+            if success:
+                self._db.execute(
+                    'UPDATE items SET status = ?, lease_expires = NULL WHERE url = ? AND worker = ?', (DONE, key, self.worker_id)
+                )
+            else:
+                self._db.execute('DELETE FROM items WHERE url = ? AND worker = ? AND status = ?', (key, self.worker_id, LEASED))
+            self._in_flight.discard(key)
+
+    def __contains__(self, url):
+        with self._lock:
+            row = self._db.execute('SELECT status FROM items WHERE url = ?', (canonicalize_url(url),)).fetchone()
+        return row is not None and row[0] == DONE
+
+    def save(self, path=None):
+        """Every change is committed as it happens, kept for the DedupIndex interface."""
+
+    # -------------------------------- Heartbeat --------------------------------- #
+
+    def renew(self):
+        """Extend every lease held by this worker."""
+        expires = time.time() + self.lease_seconds
+        with self._transaction():
+            for table in ['pages', 'items']:
+                self._db.execute(
+                    f'UPDATE {table} SET lease_expires = ? WHERE worker = ? AND status = ?', (expires, self.worker_id, LEASED)
+                )
+
+    def start_heartbeat(self):
+        """Renew the leases of this worker in the background, three times per lease period."""
+        def beat():
+            while not self._stop_heartbeat.wait(self.lease_seconds / 3):
+                try:
+                    self.renew()
+                except sqlite3.Error as e:
+                    print(f"Error renewing the leases of {self.worker_id}: {e}")
+
+        self._heartbeat = threading.Thread(target=beat, daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        if self._heartbeat is not None:
+            self._stop_heartbeat.set()
+            self._heartbeat.join()
+
+    # ---------------------------------------------------------------------------- #
+
+    def counts(self):
+        """Return {status: number of pages}, expired leases counted as pending, or failed once out of attempts."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT CASE WHEN status = ? AND lease_expires < ? THEN (CASE WHEN attempts < ? THEN ? ELSE ? END) '
+                'ELSE status END AS s, COUNT(*) FROM pages GROUP BY s',
+                (LEASED, time.time(), self.max_attempts, PENDING, FAILED)
+            ).fetchall()
+        return dict(rows)
+
+    def workers(self):
+        """Return {worker: number of pages it holds a live lease on}."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT worker, COUNT(*) FROM pages WHERE status = ? AND lease_expires >= ? GROUP BY worker',
+                (LEASED, time.time())
+            ).fetchall()
+        return dict(rows)
+
+    def print_summary(self):
+        counts = self.counts()
+        print(f"Work queue {self.db_path}: " + ', '.join(f"{counts.get(s, 0)} {s}" for s in [PENDING, LEASED, DONE, FAILED])
+              + f" pages, {self.skipped} handles and PDFs left to other workers")
+
+class _ImmediateTransaction:
+    """Take SQLite's write lock up front so that two workers never lease the same rows."""
+
+    def __init__(self, db, lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.db.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.lock.release()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or extend the shared work queue of a multi-node IRIS crawl.")
+    parser.add_argument('db_path', type=str, help="SQLite file of the work queue.")
+    parser.add_argument('--add-pages', type=int, nargs=2, metavar=('START_PAGE', 'LAST_PAGE'), default=None, help="Queue a range of discover pages.")
+    parser.add_argument('--reset-failed', action='store_true', help="Queue the pages that failed every attempt again.")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.db_path)
+    if args.add_pages:
+        queue.add_pages(range(args.add_pages[0], args.add_pages[1] + 1))
+    if args.reset_failed:
+        print(f"{queue.reset_failed()} failed pages queued again")
+    queue.print_summary()
+    for worker, nbr_pages in sorted(queue.workers().items()):
+        print(f"{worker}: {nbr_pages} pages leased")
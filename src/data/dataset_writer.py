@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+from datasets import Dataset
+
+class StreamingDatasetWriter:
+    """
+    Write string records to a Hugging Face dataset without holding them in memory.
+
+    Records are buffered and flushed as an Arrow record batch every `max_records` records or
+    about `max_bytes` of text, into an Arrow stream file (the format of the datasets cache).
+    `to_dataset` memory-maps that file and `save_to_disk` writes it in the usual
+    `save_to_disk` layout, so peak memory is one batch whatever the number of records.
+    """
+
+    def __init__(self, columns, max_records=1000, max_bytes=64 << 20, work_dir=None):
+        self.columns = list(columns)
+        self.schema = pa.schema([(column, pa.string()) for column in self.columns])
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.num_records = 0
+
+        self._own_work_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="dataset_writer_")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.path = os.path.join(self.work_dir, "data.arrow")
+        self._writer = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._buffer = {column: [] for column in self.columns}
+        self._buffer_records = 0
+        self._buffer_bytes = 0
+
+    def write(self, record):
+        for column in self.columns:
+            value = record[column]
+            self._buffer[column].append(value)
+            self._buffer_bytes += len(value) if value else 0
+        self._buffer_records += 1
+        self.num_records += 1
+
+        if self._buffer_records >= self.max_records or self._buffer_bytes >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer_records:
+            return
+        if self._writer is None:
+            self._writer = pa.ipc.new_stream(self.path, self.schema)
+        batch = pa.record_batch([pa.array(self._buffer[column], type=pa.string()) for column in self.columns], schema=self.schema)
+        self._writer.write_batch(batch)
+        self._reset_buffer()
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def to_dataset(self):
+        """Close the writer and return the records as a memory-mapped Dataset."""
+        self.close()
+        if not os.path.exists(self.path):
+            return Dataset.from_dict({column: [] for column in self.columns})
+        return Dataset.from_file(self.path)
+
+    def save_to_disk(self, dataset_path, max_shard_size="500MB"):
+        self.to_dataset().save_to_disk(dataset_path, max_shard_size=max_shard_size)
+        self.cleanup()
+
+    def cleanup(self):
+        """Remove the intermediate Arrow file once the dataset has been saved."""
+        self.close()
+        if self._own_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+class ParquetShardWriter:
+    """
+    Write records with any keys to numbered Parquet shards in `output_dir`.
+
+    Every `max_records` records, about `max_bytes` of text or `max_seconds` since the last
+    shard, the buffer is written as a complete shard (through a temporary file), so the
+    shards of an interrupted run are readable as they are and a slow producer loses at most
+    `max_seconds` of records. Records may have different keys: each shard infers its own
+    schema and `to_dataset` reads them all under their unified schema, missing columns
+    being null.
+    """
+
+    def __init__(self, output_dir, max_records=10000, max_bytes=64 << 20, max_seconds=300):
+        self.output_dir = output_dir
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.num_records = 0
+        self.shards = []
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._last_flush = time.monotonic()
+
+        # Shards of a previous run would be mixed with the new ones
+        os.makedirs(output_dir, exist_ok=True)
+        for name in os.listdir(output_dir):
+            if name.startswith("part-") and name.endswith(".parquet"):
+                os.remove(os.path.join(output_dir, name))
+
+    def write(self, record):
+        self._buffer.append(record)
+        self._buffer_bytes += sum(len(value) for value in record.values() if isinstance(value, str))
+        self.num_records += 1
+        if (len(self._buffer) >= self.max_records or self._buffer_bytes >= self.max_bytes
+                or time.monotonic() - self._last_flush >= self.max_seconds):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        columns = list(dict.fromkeys(key for record in self._buffer for key in record))
+        table = pa.Table.from_pydict({column: [record.get(column) for record in self._buffer] for column in columns})
+
+        path = os.path.join(self.output_dir, f"part-{len(self.shards):05d}.parquet")
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.shards.append(path)
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def close(self):
+        self.flush()
+
+    def schema(self):
+        return pa.unify_schemas([pq.read_schema(path) for path in self.shards], promote_options="permissive")
+
+    def to_dataset(self):
+        """Close the writer and return the shards as one memory-mapped Dataset, converted a batch at a time."""
+        self.close()
+        if not self.shards:
+            return Dataset.from_dict({})
+
+        schema = self.schema()
+        path = os.path.join(self.output_dir, "dataset.arrow")
+        with pa.ipc.new_stream(path, schema) as writer:
+            for batch in pads.dataset(self.shards, format="parquet", schema=schema).to_batches():
+                writer.write_batch(batch)
+        return Dataset.from_file(path)
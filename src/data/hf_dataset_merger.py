@@ -1,14 +1,31 @@
+import argparse
+import hashlib
+import json
 import os
-from datasets import load_from_disk, DatasetDict, concatenate_datasets
+import shutil
 
-def load_and_concatenate_datasets(folder_path):
-    """Load all datasets from the specified folder and concatenate them."""
-    dataset_paths = [
+import pyarrow as pa
+from datasets import load_from_disk, DatasetDict, Features, concatenate_datasets
+
+MANIFEST_NAME = 'merge_manifest.json'
+
+def is_saved_dataset(path):
+    """True for a folder written by `save_to_disk`, which holds its Arrow files and their state."""
+    return os.path.isfile(os.path.join(path, 'state.json')) and os.path.isfile(os.path.join(path, 'dataset_info.json'))
+
+def dataset_folders(folder_path, exclude=()):
+    """Saved datasets directly inside `folder_path`, sorted, other folders and the `exclude` paths skipped."""
+    exclude = {os.path.abspath(path) for path in exclude}
+    return [
         os.path.join(folder_path, name)
-        for name in os.listdir(folder_path)
-        if os.path.isdir(os.path.join(folder_path, name))  # Ensure it's a directory
+        for name in sorted(os.listdir(folder_path))
+        if is_saved_dataset(os.path.join(folder_path, name)) and os.path.abspath(os.path.join(folder_path, name)) not in exclude
     ]
 
+def load_and_concatenate_datasets(folder_path, exclude=()):
+    """Load all datasets from the specified folder and concatenate them."""
+    dataset_paths = dataset_folders(folder_path, exclude)
+
     # Load all datasets from the paths
     datasets = [load_from_disk(path) for path in dataset_paths]
 
@@ -25,14 +42,207 @@ def save_concatenated_dataset(hf_dataset, output_path):
     hf_dataset.save_to_disk(output_path)
     print(f"Concatenated dataset saved to {output_path}")
 
+# ------------------------------ Linked merging ------------------------------ #
+# The merged dataset is a `save_to_disk` folder whose state lists the Arrow files of
+# every source, hard-linked instead of copied: `load_from_disk` memory-maps them as
+# they are. A manifest records what each source contributed, so that a rerun only
+# links the new or changed sources.
+
+DEFAULT_KEY = ('title', 'text_sha1')
+DIGESTS = {'text_sha1': 'text'}  # Digest columns written by the crawlers -> the column they are the SHA-1 of
+
+def _read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def link_or_copy(source, destination):
+    """Hard-link a file, or copy it when the link is impossible (another filesystem)."""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+        return True
+    except OSError:
+        shutil.copy2(source, destination)
+        return False
+
+def _data_files(dataset_path):
+    return [entry['filename'] for entry in _read_json(os.path.join(dataset_path, 'state.json'))['_data_files']]
+
+def _source_fingerprint(dataset_path):
+    """
+    The state fingerprint of a source and the size and mtime of each of its Arrow files. A
+    new `save_to_disk` in the same folder rewrites the files in place, which the hard links
+    share: the changed stats tell that the source must be merged again.
+    """
+    state = _read_json(os.path.join(dataset_path, 'state.json'))
+    files = []
+    for name in _data_files(dataset_path):
+        stat = os.stat(os.path.join(dataset_path, name))
+        files.append([name, stat.st_size, stat.st_mtime_ns])
+    return {'state': state['_fingerprint'], 'files': files}
+
+def sha1_array(array):
+    return pa.array([hashlib.sha1(value.encode('utf-8')).hexdigest() if value is not None else None
+                     for value in array.to_pylist()], pa.string())
+
+def add_digests(table, key):
+    """
+    Add the digest columns of `key` that a source saved before they existed lacks, computed from
+    the column they digest. Only such sources have their text read.
+    """
+    for column in key:
+        if column not in table.column_names and DIGESTS.get(column) in table.column_names:
+            digests = pa.chunked_array([sha1_array(chunk) for chunk in table.column(DIGESTS[column]).chunks], pa.string())
+            # The features stored in the schema metadata do not list the new column
+            table = table.append_column(column, digests).replace_schema_metadata(None)
+    return table
+
+def row_keys(table, key):
+    """SHA-1 of the `key` columns of every row of a table, what duplicates are recognised by."""
+    keys = []
+    for batch in table.select(list(key)).to_batches():
+        for values in zip(*(batch.column(column).to_pylist() for column in key)):
+            keys.append(hashlib.sha1(json.dumps(values, ensure_ascii=False).encode('utf-8')).hexdigest())
+    return keys
+
+def merge_source(dataset_path, output_path, prefix, key, seen):
+    """
+    Bring one source's Arrow files into the merged folder and return (file names, keys added).
+
+    Only the `key` columns are read to find duplicates, rows whose key is in `seen` or repeated
+    within the source. Files without any are hard-linked, the others rewritten without them,
+    as are the files of a source that lacks a digest column of `key` (see add_digests).
+    """
+    files, keys, nbr_copies = [], [], 0
+    for name in _data_files(dataset_path):
+        source_file = os.path.join(dataset_path, name)
+        with pa.memory_map(source_file) as source:
+            table = pa.ipc.open_stream(source).read_all()
+            completed = add_digests(table, key)
+            if any(column not in completed.column_names for column in key):
+                raise ValueError(f"{dataset_path} lacks one of the {key} columns to deduplicate on")
+            mask = []
+            for value in row_keys(completed, key):
+                mask.append(value not in seen)
+                seen.add(value)
+                if mask[-1]:
+                    keys.append(value)
+
+            if not any(mask):
+                continue
+            destination = f"{prefix}-{name}"
+            if all(mask) and completed is table:
+                if not link_or_copy(source_file, os.path.join(output_path, destination)):
+                    nbr_copies += 1
+            else:
+                # Rows still point into the memory map, only the kept ones are written out
+                kept = completed if all(mask) else completed.filter(pa.array(mask))
+                with pa.OSFile(os.path.join(output_path, destination), 'wb') as sink, \
+                        pa.ipc.new_stream(sink, kept.schema) as writer:
+                    writer.write_table(kept)
+        files.append(destination)
+    if nbr_copies:
+        print(f"{nbr_copies} files of {dataset_path} copied, they are on another filesystem than {output_path}")
+    return files, keys
+
+def merge_linked(dataset_paths, output_path, key=DEFAULT_KEY):
+    """
+    Merge the saved datasets of `dataset_paths` into `output_path` without copying their data,
+    deduplicated on the `key` columns, and return the merged dataset. Sources merged by an
+    earlier run and unchanged since are not read again.
+
+    A row belongs to the first source merged with its key. When a source is gone or rebuilt,
+    the sources merged after it may have lost rows to it or hold rows it now has: they are
+    merged again, in order, so that every key is owned as if everything was merged at once.
+    """
+    key = list(key)
+    os.makedirs(output_path, exist_ok=True)
+    manifest_path = os.path.join(output_path, MANIFEST_NAME)
+    manifest = _read_json(manifest_path, {'key': key, 'sources': {}})
+    # The manifest knows a source by its folder name
+    sources = {}
+    for path in dataset_paths:
+        name = os.path.basename(os.path.normpath(path))
+        if name in sources:
+            raise ValueError(f"{sources[name]} and {path} have the same name {name!r}, rename one to merge both")
+        sources[name] = path
+
+    merged = list(manifest['sources'])
+    first_stale = 0 if manifest['key'] != key else len(merged)
+    for i, name in enumerate(merged[:first_stale]):
+        if name not in sources or manifest['sources'][name]['fingerprint'] != _source_fingerprint(sources[name]):
+            first_stale = i
+            break
+    for name in merged[first_stale:]:
+        for file_name in manifest['sources'].pop(name)['files']:
+            if os.path.exists(os.path.join(output_path, file_name)):
+                os.remove(os.path.join(output_path, file_name))
+    if manifest['key'] != key:
+        print(f"Deduplicated on {manifest['key']} before, not {key}: every source unmerged")
+    elif first_stale < len(merged):
+        print(f"Source {merged[first_stale]} changed or removed, it and the {len(merged) - first_stale - 1} sources merged after it unmerged")
+    manifest['key'] = key
+
+    seen = {value for source in manifest['sources'].values() for value in source['keys']}
+    for name, path in sources.items():
+        if name in manifest['sources']:
+            continue
+        fingerprint = _source_fingerprint(path)
+        files, keys = merge_source(path, output_path, hashlib.sha1(name.encode()).hexdigest()[:12], key, seen)
+        manifest['sources'][name] = {'fingerprint': fingerprint, 'files': files, 'keys': keys}
+        print(f"Merged {name}: {len(keys)} new rows")
+
+    if not manifest['sources']:
+        print("No datasets found in the specified folder.")
+        return None
+
+    # The state and info of the first source, pointed at every merged file
+    first_source = sources[next(iter(manifest['sources']))]
+    state = _read_json(os.path.join(first_source, 'state.json'))
+    data_files = [file_name for source in manifest['sources'].values() for file_name in source['files']]
+    state['_data_files'] = [{'filename': file_name} for file_name in data_files]
+    state['_fingerprint'] = hashlib.sha1(json.dumps(manifest['sources'], sort_keys=True).encode()).hexdigest()[:16]
+    info = _read_json(os.path.join(first_source, 'dataset_info.json'))
+    for stale in ['splits', 'download_size', 'dataset_size', 'size_in_bytes']:
+        info.pop(stale, None)
+    # The first source may lack the digest columns its merged files were given
+    with pa.memory_map(os.path.join(output_path, data_files[0])) as merged_file:
+        info['features'] = Features.from_arrow_schema(pa.ipc.open_stream(merged_file).schema).to_dict()
+
+    _write_json(os.path.join(output_path, 'dataset_info.json'), info)
+    _write_json(os.path.join(output_path, 'state.json'), state)
+    _write_json(manifest_path, manifest)
+    return load_from_disk(output_path)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the datasets saved in a folder into one.")
+    parser.add_argument('--folder', type=str, default='~/data_who', help="Folder of the datasets to merge.")
+    parser.add_argument('--output', type=str, default=None, help="Merged dataset, defaults to hf_raw_dataset_iris in --folder.")
+    parser.add_argument('--mode', choices=['link', 'copy'], default='link', help="'link' hard-links the Arrow files of new sources and deduplicates on --key, 'copy' concatenates and rewrites everything.")
+    parser.add_argument('--key', type=str, nargs='+', default=list(DEFAULT_KEY), help="Link mode: columns whose duplicate values are dropped, keeping the row merged first. The default, the title and the SHA-1 of the text written by the crawlers, keeps distinct documents of the same title without reading their text.")
+    args = parser.parse_args()
+
     # Define the folder containing your datasets
-    folder_path = os.path.expanduser('~/data_who')  # Use expanduser to handle the ~ symbol
-    output_path = os.path.join(folder_path, 'hf_raw_dataset_iris')
+    folder_path = os.path.expanduser(args.folder)  # Use expanduser to handle the ~ symbol
+    output_path = os.path.expanduser(args.output) if args.output else os.path.join(folder_path, 'hf_raw_dataset_iris')
 
-    # Load and concatenate datasets
-    hf_dataset_concat = load_and_concatenate_datasets(folder_path)
+    if args.mode == 'link':
+        merged = merge_linked(dataset_folders(folder_path, exclude=[output_path]), output_path, args.key)
+        if merged is not None:
+            print(f"Merged dataset of {merged.num_rows} rows saved to {output_path}")
+    else:
+        # Load and concatenate datasets
+        hf_dataset_concat = load_and_concatenate_datasets(folder_path, exclude=[output_path])
 
-    # Save the concatenated dataset if it was successfully created
-    if hf_dataset_concat:
-        save_concatenated_dataset(hf_dataset_concat, output_path)
\ No newline at end of file
+        # Save the concatenated dataset if it was successfully created
+        if hf_dataset_concat:
+            save_concatenated_dataset(hf_dataset_concat, output_path)
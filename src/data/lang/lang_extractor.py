@@ -1,18 +1,27 @@
 import argparse
 import os
 import re
+import shutil
+import sys
+import tempfile
 import time
 from tqdm import tqdm
 from io import BytesIO
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from ftlangdetect import detect
 from langcodes import *
-import fitz  # PyMuPDF
 import random
-from datasets import Dataset, DatasetDict
+from datasets import DatasetDict
 
-def extract_text(pdf_path, margin_top=40, margin_bottom=40):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_writer import StreamingDatasetWriter
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'crawler'))
+from pdf_extractor import iter_page_texts
+
+SAMPLE_PAGES = 4  # Pages kept while extracting to detect the language of a document from
+
+def extract_text(pdf_path, margin_top=40, margin_bottom=40, sample_pages=SAMPLE_PAGES):
     """
     Extracts text from the document while excluding footnotes and page numbers
     based on their position on the page.
@@ -20,30 +29,33 @@ def extract_text(pdf_path, margin_top=40, margin_bottom=40):
     :param pdf_path: Path to the PDF file.
     :param margin_top: Margin from the top of the page to exclude content (e.g., page numbers).
     :param margin_bottom: Margin from the bottom of the page to exclude content (e.g., footnotes).
+    :param sample_pages: Number of pages sampled uniformly for language detection.
 
-    :Return: Dictionary with pdf_name and text.
+    :Return: Dictionary with pdf_name, the path of a temporary file holding the text, and the
+             text of the sampled pages.
     """
+    text_fd, text_path = tempfile.mkstemp(suffix='.txt', prefix='lang_extractor_')
     try:
-        doc = fitz.open(pdf_path)  # open the PDF document
-        extracted_text = []
-
-        # Loop through each page in the document and extract relevant text
-        for page in doc:
-            page_rect = page.rect
-            content_rect = fitz.Rect(
-                page_rect.x0, margin_top, page_rect.x1, page_rect.y1 - margin_bottom
-            )
-
-            blocks = page.get_text("blocks")
-            for block in blocks:
-                block_rect = fitz.Rect(block[:4])
-                if content_rect.contains(block_rect):
-                    extracted_text.append(block[4])  # Append the text content
-
-        return {'pdf_name': os.path.basename(pdf_path), 'text': " ".join(extracted_text)}
+        # Pages are parsed one at a time and written out as they come, only the sample is kept
+        sample, nbr_pages = [], 0
+        with os.fdopen(text_fd, 'w', encoding='utf-8') as out:
+            for _, text in iter_page_texts(pdf_path, margin_top, margin_bottom):
+                if not text:
+                    continue
+                out.write(" " + text if nbr_pages else text)
+                nbr_pages += 1
+                # Reservoir sampling: every page has the same chance to be in the sample
+                if len(sample) < sample_pages:
+                    sample.append(text)
+                else:
+                    index = random.randrange(nbr_pages)
+                    if index < sample_pages:
+                        sample[index] = text
+        return {'pdf_name': os.path.basename(pdf_path), 'text_path': text_path, 'sample': " ".join(sample)}
 
     except Exception as e:
         # If any exception occurs (e.g., corrupted PDF), return 'CORRUPTED' as the text
+        os.remove(text_path)
         return {'pdf_name': os.path.basename(pdf_path), 'text': "CORRUPTED"}
 
 def extract_lang_type(file_name):
@@ -81,6 +93,37 @@ def get_random_chunks(text, num_chunks=4, words_per_chunk=6):
 
     return " ".join(chunks)
 
+def detect_lang(doc):
+    """
+    Associates a document to an ISO lang code or 'CORRUPT' if corrupted.
+
+    :param doc: A dictionary with 'pdf_name' and 'text' or 'text_path', and optionally the 'sample' of pages to detect from.
+
+    :Return: The lang code.
+    """
+    if doc.get('text') == "CORRUPTED":
+        return "CORRUPT"
+
+    # First extract language using the PDF name 
+    lang_code = extract_lang_type(doc['pdf_name'])
+    if lang_code == "unknown":
+        # Extract random chunks from the sampled pages, or the plain text, for language detection
+        chunk = get_random_chunks(doc.get('sample') or doc.get('text', ''))
+        # Detect language using the random chunk and fasttext
+        lang_code = standardize_tag(detect(chunk, low_memory=True)['lang'])
+    return lang_code
+
+def process_pdf(pdf_path):
+    """
+    Pipeline worker: extracts the text of a PDF and detects its language in the same process.
+
+    :param pdf_path: Path to the PDF file.
+
+    :Return: Tuple (lang code, {pdf_name, text_path, sample}), the text is read by LanguageWriters.
+    """
+    doc = extract_text(pdf_path)
+    return detect_lang(doc), doc
+
 def language_extractor(data):
     """
     Associates each document to an ISO lang code or marks it as 'CORRUPT' if corrupted.
@@ -91,18 +134,9 @@ def language_extractor(data):
     """
     pdf_split_by_lang = {}
 
-    # First extract language using the PDF name 
     for doc in data:
         print(f"Processing PDF: {doc['pdf_name']}")
-        if doc['text'] == "CORRUPTED":
-            lang_code = "CORRUPT"
-        else:
-            lang_code = extract_lang_type(doc['pdf_name'])
-            if lang_code == "unknown":
-                # Extract random chunks from plain text for language detection
-                chunk = get_random_chunks(doc['text'])
-                # Detect language using the random chunk and fasttext
-                lang_code = standardize_tag(detect(chunk, low_memory=True)['lang'])
+        lang_code = detect_lang(doc)
         
         if lang_code in pdf_split_by_lang:
             pdf_split_by_lang[lang_code].append(doc)
@@ -118,64 +152,123 @@ def save_to_hf_dataset(pdf_split_by_lang, output_dir="hf_datasets"):
     :param pdf_split_by_lang: Dictionary where key is lang and value is list of {pdf_name, text}.
     :param output_dir: The output directory to save the datasets.
     """
-    dataset_dict = {}
+    with LanguageWriters() as writers:
+        for lang_code, pdfs in pdf_split_by_lang.items():
+            for pdf in pdfs:
+                writers.write(lang_code, pdf)
+        return writers.save_to_hf_dataset(output_dir)
 
-    for lang_code, pdfs in pdf_split_by_lang.items():
-        # Transform list of dicts to dict of lists
-        transformed_pdfs = {
-            "pdf_name": [pdf["pdf_name"] for pdf in pdfs],
-            "text": [pdf["text"] for pdf in pdfs]
-        }
-        
-        # Create dataset from the transformed dictionary
-        dataset = Dataset.from_dict(transformed_pdfs)
-        dataset_dict[lang_code] = dataset
+class LanguageWriters:
+    """
+    Per-language writers receiving the pipeline results as they finish.
 
-    # Create a DatasetDict to hold datasets for each language
-    dataset_splits = DatasetDict(dataset_dict)
+    Each document goes to a StreamingDatasetWriter of its language as soon as it arrives, so
+    at most one batch per language is kept in memory; `save_to_hf_dataset` then saves the
+    same DatasetDict layout as the function of the same name. A document from extract_text
+    brings its text as a temporary file, read whole only for its row then removed.
+    """
 
-    # Ensure the output directory exists
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Save dataset to disk
-    dataset_path = os.path.join(output_dir, f"hf_parallel_iris_corpus")
-    dataset_splits.save_to_disk(dataset_path)
+    def __init__(self, work_dir=None):
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="lang_extractor_")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.writers = {}
+        self.counts = {}
+
+    def write(self, lang_code, doc):
+        if 'text_path' in doc:
+            # The text spooled by extract_text is only read whole for its row
+            with open(doc['text_path'], encoding='utf-8') as f:
+                doc = {'pdf_name': doc['pdf_name'], 'text': f.read()}
+            os.remove(f.name)
+        if lang_code not in self.writers:
+            self.writers[lang_code] = StreamingDatasetWriter(
+                ["pdf_name", "text"], work_dir=os.path.join(self.work_dir, lang_code)
+            )
+            self.counts[lang_code] = 0
+        self.writers[lang_code].write(doc)
+        self.counts[lang_code] += 1
 
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
 
-if __name__ == "__main__":
-    PDF_directory = "/Users/marc-antoineallard/Desktop/Msc-LIGHT-WHO/LLM4MedicalGuideline/PDF"
-    output_dir = "/Users/marc-antoineallard/Desktop/Msc-LIGHT-WHO/LLM4MedicalGuideline/"
-    pdf_data = []
+    def __enter__(self):
+        return self
 
-    start_time = time.time()
-    total_files = sum(len(files) for _, _, files in os.walk(PDF_directory))  # Get total number of PDF files
-    print(f"Total number of PDF files: {total_files}\n")
+    def __exit__(self, *exc):
+        self.close()
 
-    with tqdm(total=total_files, desc="Processing PDFs") as pbar:
-        for root, _, files in os.walk(PDF_directory):
-            for file in files:
-                if file.endswith(".pdf"):
-                    pdf_path = os.path.join(root, file)
-                    # 1- Extract: {pdf_name, text} 
-                    pdf_data.append(extract_text(pdf_path))
-                    # Update progress bar
-                    pbar.update(1)
+    def save_to_hf_dataset(self, output_dir="hf_datasets"):
+        dataset_splits = DatasetDict({
+            lang_code: writer.to_dataset() for lang_code, writer in self.writers.items()
+        })
+        os.makedirs(output_dir, exist_ok=True)
+        dataset_path = os.path.join(output_dir, f"hf_parallel_iris_corpus")
+        dataset_splits.save_to_disk(dataset_path)
 
-    end_time = time.time()
-    print(f"=== Text Extraction Done ===")
-    print(f"Time taken for text extraction: {end_time - start_time:.2f} seconds\n")
+        # The Arrow batches are no longer needed once the dataset is saved
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        return dataset_path
+
+def run_pipeline(pdf_paths, writers, workers=None, max_in_flight=None, total=None):
+    """
+    Extracts and detects the language of every PDF on a process pool, streaming results to the writers.
+
+    At most `max_in_flight` documents are submitted at a time, so memory does not grow with the corpus.
+
+    :param pdf_paths: Iterable of PDF paths.
+    :param writers: LanguageWriters receiving (lang code, doc) as results complete.
+    :param workers: Number of worker processes, defaults to the number of cores.
+    :param max_in_flight: Maximum number of submitted documents, defaults to 4 per worker.
+    :param total: Number of PDFs, for the progress bar.
+    """
+    workers = workers or os.cpu_count()
+    max_in_flight = max_in_flight or 4 * workers
+    pdf_paths = iter(pdf_paths)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, tqdm(total=total, desc="Processing PDFs") as pbar:
+        in_flight = set()
+        while True:
+            for pdf_path in pdf_paths:
+                in_flight.add(executor.submit(process_pdf, pdf_path))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                lang_code, doc = future.result()
+                writers.write(lang_code, doc)
+                pbar.update(1)
+
+def iter_pdf_paths(pdf_directory):
+    for root, _, files in os.walk(pdf_directory):
+        for file in files:
+            if file.endswith(".pdf"):
+                yield os.path.join(root, file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the text of a PDF directory and split it by language.")
+    parser.add_argument('--pdf-dir', type=str, default="/Users/marc-antoineallard/Desktop/Msc-LIGHT-WHO/LLM4MedicalGuideline/PDF")
+    parser.add_argument('--output-dir', type=str, default="/Users/marc-antoineallard/Desktop/Msc-LIGHT-WHO/LLM4MedicalGuideline/")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of processes extracting text and detecting languages.")
+    args = parser.parse_args()
 
     start_time = time.time()
+    total_files = sum(1 for _ in iter_pdf_paths(args.pdf_dir))  # Get total number of PDF files
+    print(f"Total number of PDF files: {total_files}\n")
 
-    # 2- Language detection and extraction: {lang, [{pdf_name, text},...]}
-    pdf_split_by_lang = language_extractor(pdf_data)
+    # 1- Extract {pdf_name, text} and 2- detect its language in the same worker, streaming to per-language writers
+    with LanguageWriters() as writers:
+        run_pipeline(iter_pdf_paths(args.pdf_dir), writers, workers=args.workers, total=total_files)
 
     end_time = time.time()
-    print(f"=== Language Extraction Done ===")
-    print(f"Time taken for language extraction: {end_time - start_time:.2f} seconds\n")
+    print(f"=== Text and Language Extraction Done ===")
+    print(f"Time taken for extraction with {args.workers} workers: {end_time - start_time:.2f} seconds\n")
 
-    for lang_code, documents in pdf_split_by_lang.items():
-        num_docs = len(documents)
+    for lang_code, num_docs in writers.counts.items():
         print(f"Language: {lang_code}, Number of documents: {num_docs}")
 
-    save_to_hf_dataset(pdf_split_by_lang)
\ No newline at end of file
+    writers.save_to_hf_dataset(args.output_dir)
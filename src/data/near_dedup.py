@@ -0,0 +1,169 @@
+import argparse
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from datasets import load_from_disk
+from tqdm.auto import tqdm
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64(0xFFFFFFFF)
+TOKEN_PATTERN = re.compile(r'\w+')
+SHINGLE_BLOCK = 4096  # Shingles hashed against every permutation at once, bounds the temporary matrix
+
+def permutations(num_perm, seed=1):
+    """Coefficients (a, b) of the `num_perm` hash functions (a * x + b) mod p of the MinHash."""
+    generator = np.random.RandomState(seed)
+    a = generator.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+    b = generator.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def shingles(text, shingle_size=5):
+    """
+    Distinct 32-bit hashes of the word `shingle_size`-grams of a text, lowercased. A text
+    shorter than one shingle gives a single shingle of all its words, an empty text none.
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    token_hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens))
+    width = min(shingle_size, len(tokens))
+    # Polynomial hash of every window of `width` tokens, computed a position at a time over all windows
+    nbr_windows = len(tokens) - width + 1
+    hashes = np.zeros(nbr_windows, dtype=np.uint64)
+    for position in range(width):
+        hashes = hashes * np.uint64(1000003) + token_hashes[position:position + nbr_windows]
+    return np.unique((hashes ^ (hashes >> np.uint64(32))) & MAX_HASH)
+
+def minhash(shingle_hashes, a, b):
+    """MinHash signature of a set of shingle hashes, as many 32-bit values as permutations."""
+    signature = np.full(len(a), MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(shingle_hashes), SHINGLE_BLOCK):
+        block = shingle_hashes[start:start + SHINGLE_BLOCK]
+        permuted = ((np.outer(a, block) + b[:, None]) % MERSENNE_PRIME) & MAX_HASH
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+def signatures(texts, num_perm, shingle_size):
+    """MinHash signatures of a batch of texts and whether each has any shingle."""
+    a, b = permutations(num_perm)
+    batch = np.empty((len(texts), num_perm), dtype=np.uint32)
+    has_shingles = np.zeros(len(texts), dtype=bool)
+    for i, text in enumerate(texts):
+        shingle_hashes = shingles(text or '', shingle_size)
+        has_shingles[i] = len(shingle_hashes) > 0
+        batch[i] = minhash(shingle_hashes, a, b)
+    return batch, has_shingles
+
+# ------------------------------------ LSH ----------------------------------- #
+
+def find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+def cluster_near_duplicates(signature_matrix, has_shingles, bands, threshold):
+    """
+    Return the cluster of every document, the index of its first near-duplicate or itself.
+
+    The signatures are cut into `bands` bands: documents identical on a band land in the same
+    bucket and are candidates, compared on their full signatures. Candidates whose estimated
+    Jaccard similarity reaches `threshold` are joined, so only colliding documents are
+    compared instead of every pair.
+    """
+    nbr_docs, num_perm = signature_matrix.shape
+    rows = num_perm // bands
+    parents = np.arange(nbr_docs)
+    candidates = np.flatnonzero(has_shingles)
+    for band in range(bands):
+        band_values = np.ascontiguousarray(signature_matrix[candidates, band * rows:(band + 1) * rows])
+        _, buckets = np.unique(band_values.view(np.dtype((np.void, band_values.dtype.itemsize * rows))),
+                               return_inverse=True)
+        buckets = buckets.ravel()
+        order = np.argsort(buckets, kind='stable')
+        boundaries = np.flatnonzero(np.diff(buckets[order])) + 1
+        for bucket in np.split(order, boundaries):
+            if len(bucket) < 2:
+                continue
+            members = candidates[bucket]
+            # Every member against every earlier one: a member close to a later one but not to
+            # the first of the bucket is still joined
+            for j in range(1, len(members)):
+                similarity = (signature_matrix[members[:j]] == signature_matrix[members[j]]).mean(axis=1)
+                for earlier in members[:j][similarity >= threshold]:
+                    root_earlier, root_member = find(parents, earlier), find(parents, members[j])
+                    if root_earlier != root_member:
+                        # The lowest index stays the representative of the cluster
+                        parents[max(root_earlier, root_member)] = min(root_earlier, root_member)
+    return np.array([find(parents, i) for i in range(nbr_docs)])
+
+# ---------------------------------------------------------------------------- #
+
+def near_dedup(dataset, text_column='text', num_perm=128, bands=16, threshold=0.8, shingle_size=5,
+               batch_size=256, workers=None, max_in_flight=None):
+    """
+    Return the near-duplicate cluster of every row of a dataset, see cluster_near_duplicates.
+
+    At most `max_in_flight` batches are submitted at a time, defaults to 4 per worker, so the
+    texts waiting for a process do not grow with the dataset.
+    """
+    workers = workers or os.cpu_count()
+    max_in_flight = max_in_flight or 4 * workers
+    batches = enumerate(batch[text_column] for batch in dataset.iter(batch_size=batch_size))
+    nbr_batches = (len(dataset) + batch_size - 1) // batch_size
+    signature_matrix = np.empty((len(dataset), num_perm), dtype=np.uint32)
+    has_shingles = np.zeros(len(dataset), dtype=bool)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, tqdm(total=nbr_batches, desc="MinHash signatures") as pbar:
+        in_flight = {}  # future -> index of its batch
+        while True:
+            for index, texts in batches:
+                in_flight[executor.submit(signatures, texts, num_perm, shingle_size)] = index
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                # Batches complete out of order, their rows are placed by batch index
+                start = in_flight.pop(future) * batch_size
+                batch, flags = future.result()
+                signature_matrix[start:start + len(batch)] = batch
+                has_shingles[start:start + len(batch)] = flags
+                pbar.update(1)
+    return cluster_near_duplicates(signature_matrix, has_shingles, bands, threshold)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the near-duplicate texts of a saved dataset with MinHash and LSH, and label or drop them.")
+    parser.add_argument('dataset_path', type=str, help="Dataset saved with save_to_disk, e.g. a pdf_dataset_from_X_to_Y of the crawlers.")
+    parser.add_argument('output_path', type=str, help="Where to save the labelled or deduplicated dataset.")
+    parser.add_argument('--action', choices=['label', 'drop'], default='drop', help="'label' adds the near_duplicate_of and is_near_duplicate columns, 'drop' keeps the first row of every cluster.")
+    parser.add_argument('--text-column', type=str, default='text')
+    parser.add_argument('--threshold', type=float, default=0.8, help="Estimated Jaccard similarity of the shingles from which two texts are near-duplicates.")
+    parser.add_argument('--num-perm', type=int, default=128, help="Number of MinHash permutations.")
+    parser.add_argument('--bands', type=int, default=16, help="Number of LSH bands, must divide --num-perm. More bands find pairs of lower similarity.")
+    parser.add_argument('--shingle-size', type=int, default=5, help="Number of words per shingle.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of processes computing the signatures.")
+    args = parser.parse_args()
+    if args.num_perm % args.bands:
+        parser.error("--bands must divide --num-perm")
+
+    start_time = time.time()
+    dataset = load_from_disk(args.dataset_path)
+    clusters = near_dedup(dataset, args.text_column, args.num_perm, args.bands, args.threshold, args.shingle_size,
+                          workers=args.workers)
+    is_duplicate = clusters != np.arange(len(clusters))
+    print(f"{int(is_duplicate.sum())} near-duplicates of {len(clusters)} rows, in {len(set(clusters))} clusters")
+
+    if args.action == 'label':
+        dataset = dataset.add_column('near_duplicate_of', clusters.tolist())
+        dataset = dataset.add_column('is_near_duplicate', is_duplicate.tolist())
+    else:
+        dataset = dataset.select(np.flatnonzero(~is_duplicate))
+    dataset.save_to_disk(args.output_path)
+    print(f"Dataset saved to {args.output_path} in {time.time() - start_time:.1f} seconds")
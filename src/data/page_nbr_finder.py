@@ -1,31 +1,170 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import hf_dataset_merger
+
+# The crawler modules are run as scripts from their own folder, make them importable from here too
+CRAWLER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crawler')
+sys.path.append(CRAWLER_DIR)
+import transport
+import html_extract
+import iris_crawler
+
+# Outputs of the crawlers, whose storage paths are relative to their folder
+JSON_DIR = os.path.normpath(os.path.join(CRAWLER_DIR, iris_crawler.JSON_STORAGE_PATH))
+PDF_DIR = os.path.normpath(os.path.join(CRAWLER_DIR, iris_crawler.PDF_STORAGE_PATH))
 
 # Base URL for page 1
 BASE_URL = "https://iris.who.int/discover?rpp=10&etal=0&query=Guidelines&scope=/&group_by=none&page=1"
 
 def get_total_pages(base_url):
-    """Fetches and prints the total number of pages from the first page of the URL."""
+    """Fetches, prints and returns the total number of pages from the first page of the URL, None if it is unknown."""
     try:
         # Make a request to the base URL
-        response = requests.get(base_url)
+        response = transport.get(base_url)
         response.raise_for_status()  # Check if the request was successful
 
-        # Parse the HTML content using BeautifulSoup
-        soup = BeautifulSoup(response.content, 'html.parser')
-
         # Look for the last page number in the pagination section
-        last_page_li = soup.find('li', class_='last-page-link')
+        last_page_href = html_extract.last_page_href(response.content)
         
-        if last_page_li:
-            last_page_anchor = last_page_li.find('a')
-            last_page_number = int(last_page_anchor['href'].split('page=')[-1])
+        if last_page_href:
+            last_page_number = int(last_page_href.split('page=')[-1])
             print(f"Total number of pages: {last_page_number}")
+            return last_page_number
         else:
             print("Could not find the total number of pages. It may be a single-page result.")
+            return 1
 
     except Exception as e:
         print(f"Error fetching total number of pages: {e}")
+        return None
+
+# --------------------------------- Sharding --------------------------------- #
+
+def shard_ranges(first_page, last_page, nbr_shards):
+    """Split [first_page, last_page] into at most `nbr_shards` contiguous ranges whose sizes differ by one page at most."""
+    nbr_pages = last_page - first_page + 1
+    nbr_shards = max(1, min(nbr_shards, nbr_pages))
+    size, remainder = divmod(nbr_pages, nbr_shards)
+    ranges, start = [], first_page
+    for shard in range(nbr_shards):
+        end = start + size + (shard < remainder) - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+def shard_worker_id(start_page, last_page, worker_prefix=None):
+    return f"{worker_prefix + '_' if worker_prefix else ''}shard_{start_page}_to_{last_page}"
+
+def shard_run_name(start_page, last_page, queued, worker_prefix=None):
+    """Name given by iris_crawler to the outputs of a shard: its worker in the queue, or its page range."""
+    return f"worker_{shard_worker_id(start_page, last_page, worker_prefix)}" if queued else f"{start_page}_to_{last_page}"
+
+def run_shards(ranges, mode, crawler_args, queue_path=None, worker_prefix=None):
+    """
+    Crawl every page range in its own iris_crawler process, all at once, and return the ranges that failed.
+
+    With `queue_path` the processes seed their ranges into one work queue and lease pages,
+    handles and PDFs from it, so a document or PDF shared by several shards is processed once.
+    In read mode the cores are split between the extraction pools of the shards, unless
+    `crawler_args` sets --extract-workers.
+    """
+    if mode == 'read' and not any(arg.split('=')[0] == '--extract-workers' for arg in crawler_args):
+        # Each shard would otherwise start os.cpu_count() extraction processes
+        crawler_args = crawler_args + ['--extract-workers', str(max(1, (os.cpu_count() or 1) // len(ranges)))]
+    processes = {}
+    for start_page, last_page in ranges:
+        log_path = os.path.join(JSON_DIR, f"crawl_{mode}_{start_page}_to_{last_page}.log")
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        log = open(log_path, 'w')
+        command = [sys.executable, 'iris_crawler.py', str(start_page), str(last_page), mode] + crawler_args
+        if queue_path:
+            command += ['--queue', queue_path, '--worker-id', shard_worker_id(start_page, last_page, worker_prefix)]
+        processes[(start_page, last_page)] = (subprocess.Popen(command, cwd=CRAWLER_DIR, stdout=log, stderr=subprocess.STDOUT), log)
+        print(f"Shard {start_page}-{last_page} started, logging to {log_path}")
+
+    failed = []
+    for page_range, (process, log) in processes.items():
+        return_code = process.wait()
+        log.close()
+        print(f"Shard {page_range[0]}-{page_range[1]} {'done' if return_code == 0 else f'failed with exit code {return_code}'}")
+        if return_code != 0:
+            failed.append(page_range)
+    return failed
+
+def merge_shards(ranges, mode, queued=False, worker_prefix=None):
+    """
+    Merge the outputs of the shards: their id2pdfurls JSON in download mode, their datasets in
+    read mode, hard-linked into one dataset by hf_dataset_merger instead of rewritten.
+    """
+    first_page, last_page = ranges[0][0], ranges[-1][1]
+    run_names = [shard_run_name(start, end, queued, worker_prefix) for start, end in ranges]
+    if mode == 'download':
+        id2pdfurls = {}
+        for run_name in run_names:
+            with open(os.path.join(JSON_DIR, f"id2pdfurls{'_' + run_name if queued else run_name}.json")) as json_file:
+                id2pdfurls.update(json.load(json_file))
+        output_path = os.path.join(JSON_DIR, f"id2pdfurls{first_page}_to_{last_page}.json")
+        with open(output_path, 'w') as json_file:
+            json.dump(id2pdfurls, json_file, indent=4)
+        print(f"Merged {len(id2pdfurls)} documents into {output_path}")
+    else:
+        dataset_paths = [
+            os.path.join(PDF_DIR, f"pdf_dataset_{run_name}" if queued else f"pdf_dataset_from_{run_name}")
+            for run_name in run_names
+        ]
+        # Shards without any PDF text save no dataset
+        dataset_paths = [path for path in dataset_paths if hf_dataset_merger.is_saved_dataset(path)]
+        if not dataset_paths:
+            print("No PDF data to merge.")
+            return
+        output_path = os.path.join(PDF_DIR, f"pdf_dataset_from_{first_page}_to_{last_page}")
+        merged = hf_dataset_merger.merge_linked(dataset_paths, output_path)
+        print(f"Merged {len(dataset_paths)} shard datasets, {merged.num_rows} rows, into {output_path}")
 
 if __name__ == "__main__":
-    get_total_pages(BASE_URL)
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Find the number of IRIS discover pages, and optionally crawl them in parallel shards. "
+                    "Arguments not listed here are passed on to every iris_crawler.py process."
+    )
+    parser.add_argument('--shards', type=int, default=0, help="Crawl the discover pages in this many parallel iris_crawler processes, 0 to only print the number of pages. Each process paces its own requests, --rate is per process.")
+    parser.add_argument('--mode', choices=['download', 'read'], default='download', help="Mode of operation of the crawlers.")
+    parser.add_argument('--total-pages', type=int, default=None, help="Number of discover pages, fetched from IRIS when not given.")
+    parser.add_argument('--nodes', type=int, default=1, help="Number of nodes sharing the crawl, each running its own --shards processes.")
+    parser.add_argument('--node-index', type=int, default=0, help="Index of this node among --nodes, from 0.")
+    parser.add_argument('--queue', type=str, default=None, help="Work queue shared by the shards, defaults to one per mode and page range in the JSON folder. Give the same file on a shared filesystem to every node to deduplicate across nodes.")
+    parser.add_argument('--worker-id', type=str, default=None, help="Prefix of the worker ids of the shards in the work queue, e.g. the node name.")
+    parser.add_argument('--no-queue', action='store_true', help="Let every shard crawl its pages alone, with its own deduplication: documents and PDFs shared by several shards are processed by each.")
+    args, crawler_args = parser.parse_known_args()
+    if not 0 <= args.node_index < args.nodes:
+        parser.error("--node-index must be between 0 and --nodes - 1")
+
+    total_pages = args.total_pages or get_total_pages(BASE_URL)
+    if not args.shards:
+        sys.exit(0)
+    if total_pages is None:
+        parser.error("the number of pages could not be fetched, give it with --total-pages")
+
+    # Every node takes a contiguous slice of the pages, which its processes split again
+    node_start, node_end = shard_ranges(1, total_pages, args.nodes)[args.node_index]
+    ranges = shard_ranges(node_start, node_end, args.shards)
+    print(f"Crawling pages {node_start} to {node_end} in '{args.mode}' mode with {len(ranges)} processes.")
+    # Harvesting reads its records in one pass and cannot lease pages
+    queued = not args.no_queue and not any(arg.split('=')[0] == '--harvest' for arg in crawler_args)
+    queue_path = (args.queue or os.path.join(JSON_DIR, f"work_queue_{args.mode}_{node_start}_to_{node_end}.sqlite")) if queued else None
+    start_time = time.time()
+    failed = run_shards(ranges, args.mode, crawler_args, queue_path, args.worker_id)
+    if failed:
+        if queued:
+            print(f"Not merging, rerun the same command to finish the pages left in {queue_path}: " + ', '.join(f"{start}-{end}" for start, end in failed) + " failed")
+        else:
+            print("Not merging, rerun iris_crawler.py with --resume on the failed pages: " + ', '.join(f"{start}-{end}" for start, end in failed))
+        sys.exit(1)
+    # Queued shards name their outputs after their workers, even a single one
+    if len(ranges) > 1 or queued:
+        merge_shards(ranges, args.mode, queued, args.worker_id)
+    print(f"Time taken to crawl from page {node_start} to {node_end}: {time.time() - start_time:.2f} seconds")
@@ -1,49 +1,92 @@
-# import zarr
-# import threading
-# import pandas as pd
-# from tqdm.auto import tqdm
-# from concurrent.futures import ThreadPoolExecutor
-# from itertools import repeat
-# from urllib.parse import quote, unquote
-# from io import StringIO
-
-# def parse_metadata(link_group):
-#     """
-#         Metadata parser, populate a metadata dict 
-#     """
-#     metadata = {}
-#     try: metadata_str = pd.read_csv(StringIO(link_group['metadata'][:].tobytes().decode('utf-8')), na_filter=False)
-#     except: return metadata
-#     for _, row in metadata_str.iterrows():
-#         key, value = row[metadata_str.columns[0]], row[metadata_str.columns[1]]
-#         metadata[key] = metadata.get(key, []) + [value]
-#     return metadata
-
-# def process_link_group(link_group, link_pbar):
-#     """
-#         Single link group processer. Parse individually their metadata.
-#     """
-#     if not (metadata := parse_metadata(link_group)):
-#         link_pbar.update(1)
-#         return
-#     idd = unquote(link_group.basename).split('/handle/')[1].split('?')[0]
-#     with dc_lock:
-#         dcs[idd] = {
-#             'id': idd,
-#             'language': metadata.get('dc.language.iso', ['']),
-#             'file_link': metadata.get('dc.file-link', [''])
-#         }
-#     link_pbar.update(1)
-
-# basemap = "https://iris.who.int/htmlmap"
-# zstore = zarr.storage.DirectoryStore('who.iris')
-# zroot = zarr.open_group(store=zstore, mode='r')
-# dcs = {}
-# dc_lock = threading.Lock()
-
-# with tqdm(zroot.values(), desc=f"{f"Processing maps in {basemap.split('/')[-1]}":<39}", ncols=1000) as pbar:
-#     for submap_group in pbar:
-#         link_groups = list(submap_group.values())
-#         with tqdm(total=len(link_groups), desc=f"{f"Processing links in {unquote(submap_group.basename).split('/')[-1]}":<40}", leave=False, ncols=1000) as link_pbar:
-#             with ThreadPoolExecutor(max_workers=64) as executor:
-#                 executor.map(process_link_group, link_groups, repeat(link_pbar))
\ No newline at end of file
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import zarr
+from tqdm.auto import tqdm
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'crawler'))
+from iris_harvest import link_group_handle
+
+KEYS = {'dc.language.iso': 'language', 'dc.file-link': 'file_link'}
+INDEX_SCHEMA = pa.schema([('id', pa.string()), ('language', pa.list_(pa.string())), ('file_link', pa.list_(pa.string()))])
+
+CSV_READ_OPTIONS = pacsv.ReadOptions(column_names=['key', 'value'], skip_rows=1)
+CSV_PARSE_OPTIONS = pacsv.ParseOptions(newlines_in_values=True)
+CSV_CONVERT_OPTIONS = pacsv.ConvertOptions(column_types={'key': pa.string(), 'value': pa.string()}, strings_can_be_null=False)
+
+def parse_metadata(content):
+    """Parse a link group's key,value metadata CSV into a (key, value) table, None if it is empty or malformed."""
+    try:
+        table = pacsv.read_csv(pa.py_buffer(content), CSV_READ_OPTIONS, CSV_PARSE_OPTIONS, CSV_CONVERT_OPTIONS)
+    except pa.ArrowInvalid:
+        return None
+    return table if table.num_rows else None
+
+def index_submap(store_path, submap_name):
+    """
+    Index the link groups of one submap: one row per item, with its languages and file links.
+
+    The CSVs are parsed by Arrow's C parser, then filtered and grouped per item as whole
+    columns instead of row by row.
+    """
+    submap_group = zarr.open_group(store_path, mode='r')[submap_name]
+    tables = []
+    for name, link_group in submap_group.groups():
+        handle = link_group_handle(name)
+        if handle is None or 'metadata' not in link_group:
+            continue
+        table = parse_metadata(link_group['metadata'][:].tobytes())
+        if table is not None:
+            tables.append(table.append_column('id', pa.array([handle] * table.num_rows, pa.string())))
+    if not tables:
+        return INDEX_SCHEMA.empty_table()
+
+    metadata = pa.concat_tables(tables)
+    ids = pc.unique(metadata['id'])
+    columns = []
+    for key in KEYS:
+        values = metadata.filter(pc.equal(metadata['key'], key))
+        grouped = values.group_by('id', use_threads=False).aggregate([('value', 'list')])
+        # Align the lists on the item ids, items without the key getting an empty list
+        lists = grouped['value_list'].take(pc.index_in(ids, grouped['id']))
+        columns.append(pc.fill_null(lists, pa.scalar([], pa.list_(pa.string()))))
+    return pa.table([ids] + columns, schema=INDEX_SCHEMA).sort_by('id')
+
+def build_index(store_path, workers=None):
+    """Index every submap of the zarr mirror in a process pool and return the handle index as one table."""
+    root = zarr.open_group(store_path, mode='r')
+    submap_names = sorted(name for name, _ in root.groups())
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tables = list(tqdm(
+            executor.map(index_submap, [store_path] * len(submap_names), submap_names),
+            total=len(submap_names), desc="Indexing submaps"
+        ))
+    return pa.concat_tables(tables) if tables else INDEX_SCHEMA.empty_table()
+
+def load_index(index_path):
+    """Load a handle index as {id: {'language': [...], 'file_link': [...]}}."""
+    table = pq.read_table(index_path)
+    return {
+        row['id']: {'language': row['language'], 'file_link': row['file_link']}
+        for row in table.to_pylist()
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the languages and file links of every item of the IRIS zarr mirror into a Parquet file.")
+    parser.add_argument('--store', type=str, default='who.iris', help="Path of the zarr mirror of the IRIS htmlmap.")
+    parser.add_argument('--output', type=str, default='iris_handle_index.parquet', help="Parquet file of the handle index.")
+    parser.add_argument('--workers', type=int, default=None, help="Number of indexing processes, defaults to the number of CPUs.")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    index = build_index(args.store, args.workers)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    pq.write_table(index, args.output, compression='zstd')
+    print(f"Indexed {index.num_rows} items in {time.time() - start_time:.1f} seconds, saved to {args.output}")